@@ -0,0 +1,135 @@
+"""NFC Roon Controller - In-memory album index for instant search"""
+import bisect
+import difflib
+import heapq
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+MAX_RESULTS = 15
+FUZZY_CUTOFF = 0.75
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Beyoncé" -> "beyonce")"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str) -> list:
+    return re.findall(r"\w+", normalize(text))
+
+
+@dataclass(frozen=True)
+class Album:
+    """One library album as listed in Library > Albums"""
+    title: str
+    artist: str = ""
+    year: str = ""
+    image_key: str = ""
+
+    @property
+    def key(self) -> tuple:
+        return (self.title, self.artist)
+
+    def as_result(self) -> dict:
+        """Same shape as RoonController.search() results"""
+        return {"title": self.title, "subtitle": self.artist,
+                "hint": self.year, "image_key": self.image_key}
+
+
+class AlbumIndex:
+    """Token index over album titles/artists with prefix and fuzzy matching"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._albums = {}       # id -> Album
+        self._titles = {}       # id -> normalized title (ranking)
+        self._ids = {}          # Album.key -> id
+        self._postings = {}     # token -> set of ids
+        self._vocab = []        # sorted tokens, for prefix lookups
+        self._next_id = 0
+        self.ready = False
+
+    def __len__(self):
+        return len(self._albums)
+
+    def sync(self, albums: list) -> tuple:
+        """Apply a full crawl incrementally; returns (added, removed)"""
+        fresh = {a.key: a for a in albums}
+        with self._lock:
+            removed = [k for k in self._ids if k not in fresh]
+            for k in removed:
+                self._remove(self._ids.pop(k))
+
+            added = 0
+            for k, album in fresh.items():
+                aid = self._ids.get(k)
+                if aid is not None:
+                    if self._albums[aid] == album:
+                        continue
+                    self._remove(aid)
+                else:
+                    added += 1
+                    aid = self._ids[k] = self._next_id
+                    self._next_id += 1
+                self._add(aid, album)
+
+            self._vocab = sorted(self._postings)
+            self.ready = True
+        return added, len(removed)
+
+    def _add(self, aid: int, album: Album):
+        self._albums[aid] = album
+        self._titles[aid] = normalize(album.title)
+        for token in set(tokenize(f"{album.title} {album.artist} {album.year}")):
+            self._postings.setdefault(token, set()).add(aid)
+
+    def _remove(self, aid: int):
+        album = self._albums.pop(aid)
+        del self._titles[aid]
+        for token in set(tokenize(f"{album.title} {album.artist} {album.year}")):
+            ids = self._postings.get(token)
+            if ids is not None:
+                ids.discard(aid)
+                if not ids:
+                    del self._postings[token]
+
+    def _match_token(self, token: str) -> set:
+        """Albums with a token starting with `token`, else close spellings"""
+        lo = bisect.bisect_left(self._vocab, token)
+        hi = bisect.bisect_left(self._vocab, token + "\uffff")
+        ids = set()
+        for t in self._vocab[lo:hi]:
+            ids |= self._postings[t]
+        if ids:
+            return ids
+
+        # Fuzzy fallback, restricted to tokens sharing the first letter
+        lo = bisect.bisect_left(self._vocab, token[0])
+        hi = bisect.bisect_left(self._vocab, token[0] + "\uffff")
+        for t in difflib.get_close_matches(token, self._vocab[lo:hi], n=3, cutoff=FUZZY_CUTOFF):
+            ids |= self._postings[t]
+        return ids
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> list:
+        """Albums matching every query token (prefix/fuzzy), best first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            ids = None
+            for token in tokens:
+                ids = self._match_token(token) if ids is None else ids & self._match_token(token)
+                if not ids:
+                    return []
+
+            q = normalize(query).strip()
+
+            def rank(aid):
+                title = self._titles[aid]
+                return (not title.startswith(q), q not in title, title)
+
+            return [self._albums[i].as_result() for i in heapq.nsmallest(limit, ids, key=rank)]
@@ -0,0 +1,148 @@
+"""NFC Roon Controller - On-disk artwork cache with size variants"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import requests
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# roonapi's get_image() default: "full" covers are at most 500x500
+FULL_SIZE = 500
+
+# Variant name -> square size in px (None = as served by the Roon core)
+SIZES = {
+    "full": None,
+    "thumb": 120,
+    "kindle": 480,
+    "crt": 240,
+    "print": 531,   # 4.5 cm at 300 dpi
+}
+
+
+class ArtworkCache:
+    """Covers keyed by image_key and size, evicted LRU within a byte budget"""
+
+    def __init__(self, url_for, directory: str, max_bytes: int):
+        self.url_for = url_for          # (image_key, px=None) -> Roon image URL
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()   # filename -> size, least recently used first
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.unlink(path)
+            elif os.path.isfile(path):
+                st = os.stat(path)
+                files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    @staticmethod
+    def etag(image_key: str, size: str) -> str:
+        return hashlib.sha1(f"{image_key}:{size}".encode()).hexdigest()
+
+    def path(self, image_key: str, size: str = "full") -> str | None:
+        """Local file for a cover variant, fetching/resizing on a miss"""
+        if not image_key or size not in SIZES:
+            return None
+        name = self.etag(image_key, size)
+        path = os.path.join(self.directory, name)
+
+        with self._key_lock(name):
+            if self._touch(name, path):
+                return path
+
+            try:
+                data = self._build(image_key, size)
+            except Exception as e:
+                print(f"Artwork fetch error ({size}): {e}")
+                return None
+            if not data:
+                return None
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._add(name, len(data))
+        return path
+
+    def read(self, image_key: str, size: str = "full") -> bytes | None:
+        path = self.path(image_key, size)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _build(self, image_key: str, size: str) -> bytes | None:
+        px = SIZES[size]
+        # Larger than "full" (or no PIL to resize): Roon scales from its original
+        if px is None or px > FULL_SIZE or not PIL_AVAILABLE:
+            url = self.url_for(image_key, px) if px else self.url_for(image_key)
+            if not url:
+                return None
+            response = requests.get(url, timeout=10)
+            response.raise_for_status()
+            return response.content
+
+        # Smaller variants are derived from the cached "full" cover, never fetched again
+        original = self.path(image_key, "full")
+        if not original:
+            return None
+        with Image.open(original) as img:
+            img = img.convert("RGB")
+            img.thumbnail((px, px), Image.Resampling.LANCZOS)
+            out = BytesIO()
+            img.save(out, "JPEG", quality=88)
+        return out.getvalue()
+
+    def _key_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(name, threading.Lock())
+
+    def _touch(self, name: str, path: str) -> bool:
+        with self._lock:
+            if name not in self._entries:
+                return False
+            self._entries.move_to_end(name)
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            return False
+
+    def _add(self, name: str, size: int):
+        with self._lock:
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                self._key_locks.pop(old, None)
+                try:
+                    os.unlink(os.path.join(self.directory, old))
+                except FileNotFoundError:
+                    pass
+
+
+def mimetype(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(8)
+    return "image/png" if head.startswith(b"\x89PNG") else "image/jpeg"
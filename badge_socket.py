@@ -0,0 +1,121 @@
+"""NFC Roon Controller - Local reader -> server transport (Unix socket, JSON lines)"""
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+
+BADGE_SOCKET = "/tmp/nfc-roon-badge.sock"
+AVAILABLE = hasattr(socket, "AF_UNIX")
+
+
+# === Server (serveur.py) ===
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One reader process; each line is a tap, answered as soon as it is handled"""
+
+    def handle(self):
+        write_lock = threading.Lock()
+
+        def answer(message):
+            try:
+                reply = self.server.handler(message)
+            except Exception as e:
+                reply = {"status": "error", "message": str(e)}
+            reply = {**reply, "id": message.get("id")}
+            with write_lock:
+                try:
+                    self.wfile.write(json.dumps(reply).encode() + b"\n")
+                except OSError:
+                    pass
+
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            # A slow tap on one reader must not delay the next line
+            threading.Thread(target=answer, args=(message,), daemon=True).start()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(handler, path: str = BADGE_SOCKET):
+    """Listen on `path` in a background thread; handler(dict) -> dict"""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = _Server(path, _Handler)
+    server.handler = handler
+    os.chmod(path, 0o666)   # nfc_reader may run as another user (root for PC/SC)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# === Client (nfc_reader.py) ===
+
+class BadgeClient:
+    """
+    Persistent connection to serveur.py; send() does not wait for the reply,
+    on_reply(message, reply) is called from a reader thread when it arrives.
+    """
+
+    def __init__(self, on_reply, path: str = BADGE_SOCKET):
+        self.path = path
+        self.on_reply = on_reply
+        self._sock = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        self._sock = sock
+        threading.Thread(target=self._read_replies, args=(sock,), daemon=True).start()
+
+    def send(self, message: dict) -> bool:
+        """False if the server socket is unavailable (caller falls back to HTTP)"""
+        if not AVAILABLE:
+            return False
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                message = {**message, "id": next(self._ids)}
+                self._pending[message["id"]] = message
+                self._sock.sendall(json.dumps(message).encode() + b"\n")
+                return True
+            except OSError:
+                self._close()
+                return False
+
+    def _read_replies(self, sock):
+        try:
+            for line in sock.makefile("rb"):
+                reply = json.loads(line)
+                with self._lock:
+                    message = self._pending.pop(reply.get("id"), None)
+                if message:
+                    self.on_reply(message, reply)
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._close()
+
+    def _close(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        for message in self._pending.values():
+            self.on_reply(message, {"status": "error", "message": "connection lost"})
+        self._pending.clear()
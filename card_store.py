@@ -0,0 +1,87 @@
+"""NFC Roon Controller - Card repository (SQLite, WAL)"""
+import json
+import sqlite3
+import threading
+from utils import MAPPING_FILE, load_mapping
+
+CARDS_DB = "cards.db"
+
+
+class CardStore:
+    """
+    Card-to-content mapping persisted one row per card.
+
+    Behaves like the former mapping dict (get, in, [], items...) but every
+    write is a single crash-safe upsert/delete instead of a full-file rewrite.
+    Reads are served from memory.
+    """
+
+    def __init__(self, path: str = CARDS_DB, legacy_json: str = MAPPING_FILE):
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cards (uid TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._import_json(legacy_json)
+        self._cards = {uid: json.loads(data) for uid, data in self._db.execute("SELECT uid, data FROM cards")}
+
+    def _import_json(self, legacy_json: str):
+        """One-time import of mapping.json"""
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+        mapping = load_mapping(legacy_json)
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cards (uid, data) VALUES (?, ?)",
+                [(uid, json.dumps(card, ensure_ascii=False)) for uid, card in mapping.items()]
+            )
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (str(len(mapping)),))
+        if mapping:
+            print(f"Imported {len(mapping)} cards from {legacy_json}")
+
+    # === Writes ===
+
+    def __setitem__(self, uid: str, card: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO cards (uid, data) VALUES (?, ?) ON CONFLICT(uid) DO UPDATE SET data = excluded.data",
+                (uid, json.dumps(card, ensure_ascii=False))
+            )
+            self._cards[uid] = card
+
+    def __delitem__(self, uid: str):
+        with self._lock:
+            if uid not in self._cards:
+                raise KeyError(uid)
+            self._db.execute("DELETE FROM cards WHERE uid = ?", (uid,))
+            del self._cards[uid]
+
+    def save(self, uid: str):
+        """Persist a card modified in place"""
+        with self._lock:
+            self[uid] = self._cards[uid]
+
+    # === Reads (memory) ===
+
+    def __getitem__(self, uid: str) -> dict:
+        return self._cards[uid]
+
+    def __contains__(self, uid) -> bool:
+        return uid in self._cards
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def get(self, uid: str, default=None):
+        return self._cards.get(uid, default)
+
+    def items(self) -> list:
+        """Snapshot, safe to iterate while other threads write"""
+        with self._lock:
+            return list(self._cards.items())
+
+    def values(self) -> list:
+        with self._lock:
+            return list(self._cards.values())
@@ -0,0 +1,189 @@
+"""NFC Roon Controller - Prioritized command pipeline (single Roon API owner)"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+from tracing import tracer
+
+# Lower runs first
+PRIORITY_TAP = 0           # card taps and playback controls
+PRIORITY_BROWSE = 1        # admin listings and search
+PRIORITY_BACKGROUND = 2    # library crawl, card reference resolution
+
+
+class CommandCancelled(Exception):
+    pass
+
+
+class Command:
+    """One queued call; cancellable until the worker starts it"""
+
+    def __init__(self, priority: int, deadline: float | None, func, args, kwargs):
+        self.priority = priority
+        self.deadline = deadline
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.context = contextvars.copy_context()   # keeps the caller's trace
+        self.queued = time.perf_counter()
+        self.started = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self, error: Exception = None) -> bool:
+        """Drop the command if it has not started yet"""
+        with self._lock:
+            if self.started or self._done.is_set():
+                return False
+            self.cancelled = True
+        self._finish(error=error or CommandCancelled())
+        return True
+
+    def _start(self) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                self.cancelled = True
+            else:
+                self.started = True
+        if self.cancelled:
+            self._finish(error=TimeoutError("deadline passed in queue"))
+        return self.started
+
+    def _finish(self, result=None, error=None):
+        self.result, self.error = result, error
+        self._done.set()
+
+    def wait(self):
+        """Result of the call; raises if it failed, expired or was cancelled"""
+        remaining = None if self.deadline is None else self.deadline - time.monotonic()
+        if not self._done.wait(max(0, remaining) if remaining is not None else None):
+            # Not started in time: give up; already running: let it finish
+            if not self.cancel(TimeoutError("not started before deadline")):
+                self._done.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class CommandPipeline:
+    """
+    Worker threads run commands by priority, FIFO within a priority. A tap
+    never waits behind queued admin requests; `tap_workers` extra workers
+    only take PRIORITY_TAP commands, so a tap does not wait for a long
+    browse even when every other worker is busy.
+    """
+
+    def __init__(self, name: str = "roon", workers: int = 1, tap_workers: int = 0):
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"{name}-commands-{i}", daemon=True).start()
+        for i in range(tap_workers):
+            threading.Thread(target=self._run, args=(PRIORITY_TAP,), name=f"{name}-taps-{i}", daemon=True).start()
+
+    def submit(self, priority: int, func, *args, timeout: float = None, **kwargs) -> Command:
+        """Queue func(*args, **kwargs); `timeout` is the deadline to start it"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        command = Command(priority, deadline, func, args, kwargs)
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._seq), command))
+            self._cond.notify_all()   # tap workers ignore other priorities
+        return command
+
+    def call(self, priority: int, func, *args, timeout: float = None, default=None, **kwargs):
+        """Run through the queue and wait; `default` if it expires or fails"""
+        if getattr(self._local, "worker", False):
+            return func(*args, **kwargs)   # already on a worker (nested call)
+        try:
+            return self.submit(priority, func, *args, timeout=timeout, **kwargs).wait()
+        except (TimeoutError, CommandCancelled) as e:
+            print(f"[{self.name}] {getattr(func, '__name__', func)} dropped: {str(e) or 'cancelled'}")
+        except Exception as e:
+            print(f"[{self.name}] {getattr(func, '__name__', func)} error: {e}")
+        return default
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self, max_priority: int = None):
+        self._local.worker = True
+        while True:
+            with self._cond:
+                while not self._heap or (max_priority is not None and self._heap[0][0] > max_priority):
+                    self._cond.wait()
+                _, _, command = heapq.heappop(self._heap)
+            if not command._start():
+                continue
+            command.context.run(self._execute, command)
+
+    def _execute(self, command: Command):
+        tracer.record_current(f"{self.name}.queue", (time.perf_counter() - command.queued) * 1000)
+        try:
+            command._finish(result=command.func(*command.args, **command.kwargs))
+        except Exception as e:
+            command._finish(error=e)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.expires = 0.0
+
+
+class Singleflight:
+    """
+    Concurrent calls with the same key share one execution; with `fresh`,
+    its result is also reused for that many seconds after it completes.
+    """
+
+    MAX_KEYS = 256
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, fresh: float = 0.0):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None or (flight.done.is_set() and time.monotonic() >= flight.expires)
+            if leader:
+                if len(self._flights) >= self.MAX_KEYS:
+                    self._prune()
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+        else:
+            try:
+                flight.result = func()
+            except Exception as e:
+                flight.error = e
+            finally:
+                flight.expires = time.monotonic() + fresh
+                flight.done.set()
+                if not fresh:
+                    with self._lock:
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+
+        if flight.error:
+            raise flight.error
+        return flight.result
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [k for k, f in self._flights.items() if f.done.is_set() and now >= f.expires]:
+            del self._flights[key]
@@ -15,6 +15,10 @@ APP_INFO = {
 SERVER_PORT = 5001
 SCAN_TIMEOUT = 30  # seconds
 
+# Artwork cache
+ARTWORK_CACHE_DIR = "artwork_cache"
+ARTWORK_CACHE_BYTES = 200 * 1024 * 1024  # LRU budget on disk
+
 # Settings file path
 SETTINGS_FILE = "settings.json"
 
@@ -0,0 +1,59 @@
+"""NFC Roon Controller - Server-Sent Events"""
+import json
+import queue
+import threading
+
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments on an idle stream
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBus:
+    """Fan-out of named events to Server-Sent Events subscribers"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data):
+        """Send an event to every subscriber (slow clients drop events)"""
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def stream(self, initial=()):
+        """SSE generator: initial (event, data) pairs, then live events"""
+        q = self.subscribe()
+        try:
+            for event, data in initial:
+                yield format_event(event, data)
+            while True:
+                try:
+                    yield q.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(q)
+
+
+def format_event(event: str, data) -> str:
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,212 @@
+"""NFC Roon Controller - Columnar listening history (memory-mapped, NumPy)"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+HISTORY_FILE = "history.bin"
+HISTORY_INDEX = "history.json"
+
+# One fixed-width record per event (8 bytes)
+RECORD = np.dtype([
+    ("ts", "<u4"),      # unix time (s, UTC)
+    ("card", "<u2"),    # index into cards
+    ("zone", "u1"),     # index into zones
+    ("action", "u1"),   # index into ACTIONS
+])
+
+ACTIONS = ("play", "pause", "volume", "shuffle", "display", "imported")
+PLAY_ACTIONS = ("play", "imported")   # what counts as a play
+# Imported plays have made-up timestamps (spread between first and last play):
+# they count in totals, never in hour/weekday/day/month buckets
+TIMED_PLAY_ACTIONS = ("play",)
+TIME_BUCKETS = ("hour", "weekday", "day", "month")
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+class PlayHistory:
+    """
+    Append-only event log read as a memory-mapped NumPy array.
+
+    Card uids and zone names are interned in a small JSON index so each
+    record stays fixed-width; queries filter and aggregate column-wise.
+    """
+
+    def __init__(self, path: str = HISTORY_FILE, index_path: str = HISTORY_INDEX):
+        self.path = path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._map = None
+        self._index = self._load_index()
+        self._card_ids = {uid: i for i, uid in enumerate(self._index["cards"])}
+        self._zone_ids = {name: i for i, name in enumerate(self._index["zones"])}
+        self._repair()
+
+    def _load_index(self) -> dict:
+        index = {"cards": [], "zones": [], "titles": {}}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index.update(json.load(f))
+            except Exception:
+                pass
+        return index
+
+    def _save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def _repair(self):
+        """Drop a partial record left by a crash mid-write"""
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size % RECORD.itemsize:
+            with open(self.path, "r+b") as f:
+                f.truncate(size - size % RECORD.itemsize)
+
+    @property
+    def meta(self) -> dict:
+        """Free-form flags persisted with the index"""
+        return self._index.setdefault("meta", {})
+
+    # === Writes ===
+
+    def _intern(self, table: dict, names: list, name: str, limit: int) -> int:
+        if name not in table:
+            if len(names) >= limit:
+                raise ValueError(f"history index full ({limit})")
+            table[name] = len(names)
+            names.append(name)
+        return table[name]
+
+    def append(self, events: list):
+        """events: (ts, uid, zone, action, title) tuples"""
+        if not events:
+            return
+        with self._lock:
+            records = np.empty(len(events), dtype=RECORD)
+            index_changed = False
+            for i, (ts, uid, zone, action, title) in enumerate(events):
+                count = len(self._index["cards"]) + len(self._index["zones"])
+                records[i] = (
+                    int(ts),
+                    self._intern(self._card_ids, self._index["cards"], uid, 0xFFFF),
+                    self._intern(self._zone_ids, self._index["zones"], zone or "", 0xFF),
+                    ACTIONS.index(action),
+                )
+                index_changed |= count != len(self._index["cards"]) + len(self._index["zones"])
+                if title and self._index["titles"].get(uid) != title:
+                    self._index["titles"][uid] = title
+                    index_changed = True
+
+            # Index first: a record must never point to an unknown card
+            if index_changed:
+                self._save_index()
+            with open(self.path, "ab") as f:
+                f.write(records.tobytes())
+
+    def save_meta(self):
+        with self._lock:
+            self._save_index()
+
+    # === Reads ===
+
+    def records(self) -> np.ndarray:
+        """All events, memory-mapped (remapped only when the file grew)"""
+        with self._lock:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            count = size // RECORD.itemsize
+            if count == 0:
+                return np.empty(0, dtype=RECORD)
+            if self._map is None or len(self._map) != count:
+                self._map = np.memmap(self.path, dtype=RECORD, mode="r", shape=(count,))
+            return self._map
+
+    def title(self, uid: str) -> str:
+        return self._index["titles"].get(uid, "")
+
+    def select(self, start: float = None, end: float = None, actions=None) -> np.ndarray:
+        """Events in [start, end) with one of `actions` (names)"""
+        rec = self.records()
+        mask = np.ones(len(rec), dtype=bool)
+        if start is not None:
+            mask &= rec["ts"] >= int(start)
+        if end is not None:
+            mask &= rec["ts"] < int(end)
+        if actions:
+            codes = [ACTIONS.index(a) for a in actions]
+            mask &= np.isin(rec["action"], codes)
+        return rec[mask]
+
+    def _labels(self, rec: np.ndarray, group_by: str, attribute=None) -> tuple:
+        """(keys, label function) for one group-by dimension"""
+        if group_by == "card":
+            return rec["card"], lambda k: self._index["cards"][k]
+        if group_by == "zone":
+            return rec["zone"], lambda k: self._index["zones"][k]
+        if group_by == "action":
+            return rec["action"], lambda k: ACTIONS[k]
+
+        local = rec["ts"].astype(np.int64) + _utc_offset()
+        if group_by == "hour":
+            return (local // 3600) % 24, int
+        if group_by == "weekday":
+            return (local // 86400 + 3) % 7, lambda k: WEEKDAYS[k]   # 1970-01-01 = Thursday
+        if group_by == "day":
+            return local // 86400, lambda k: str(np.datetime64(int(k), "D"))
+        if group_by == "month":
+            months = local.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+            return months, lambda k: str(np.datetime64(int(k), "M"))
+
+        # Any other dimension is a card field (genre, artist, content_type...)
+        values = [str((attribute(uid) or {}).get(group_by) or "") if attribute else ""
+                  for uid in self._index["cards"]]
+        names, per_card = np.unique(values or [""], return_inverse=True)
+        return per_card[rec["card"]], lambda k: str(names[k])
+
+    def group(self, rec: np.ndarray, group_by: str, top: int = None, attribute=None) -> list:
+        """[{key, plays}] per bucket; time buckets in order, others by count (top-k)"""
+        if len(rec) == 0:
+            return []
+        keys, label = self._labels(rec, group_by, attribute)
+        # All keys are small dense integers: one counting pass, no sort
+        keys = np.asarray(keys, dtype=np.int64)
+        base = int(keys.min())
+        counts = np.bincount(keys - base)
+        values = np.flatnonzero(counts)
+        counts, values = counts[values], values + base
+        if group_by not in TIME_BUCKETS:
+            if top and top < len(counts):
+                keep = np.argpartition(-counts, top - 1)[:top]
+                values, counts = values[keep], counts[keep]
+            order = np.argsort(-counts, kind="stable")
+            values, counts = values[order], counts[order]
+        elif top:
+            values, counts = values[-top:], counts[-top:]
+        return [{"key": label(int(v)), "plays": int(c)} for v, c in zip(values, counts)]
+
+    def card_activity(self, rec: np.ndarray) -> dict:
+        """uid -> (plays, first_ts, last_ts)"""
+        if len(rec) == 0:
+            return {}
+        n = len(self._index["cards"])
+        cards = rec["card"].astype(np.int64)
+        ts = rec["ts"].astype(np.int64)
+        plays = np.bincount(cards, minlength=n)
+        first = np.full(n, np.iinfo(np.int64).max)
+        last = np.zeros(n, dtype=np.int64)
+        np.minimum.at(first, cards, ts)
+        np.maximum.at(last, cards, ts)
+        return {self._index["cards"][i]: (int(plays[i]), int(first[i]), int(last[i]))
+                for i in np.flatnonzero(plays)}
+
+
+def _utc_offset() -> int:
+    """Current local UTC offset in seconds (for hour/day buckets)"""
+    return time.localtime().tm_gmtoff
@@ -4,12 +4,13 @@ Kindle Display Module - Affiche pochette et infos album sur Kindle PW1
 Pour intégration avec NFC Roon Controller
 """
 
-import subprocess
-import os
-import tempfile
-from PIL import Image, ImageDraw, ImageFont
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 import requests
 from io import BytesIO
+from remote import get_host
 
 # Configuration Kindle
 KINDLE_IP = "192.168.1.63"
@@ -21,152 +22,266 @@ KINDLE_HEIGHT = 800
 
 # Chemins sur le Kindle
 KINDLE_IMAGE_PATH = "/mnt/us/display.png"
+KINDLE_PARTIAL_PATH = "/mnt/us/display-partial.png"
 
+# Rafraîchissement partiel (sans flash) : un rafraîchissement complet toutes
+# les N mises à jour partielles pour effacer la rémanence
+FULL_REFRESH_EVERY = 10
+PARTIAL_MAX_AREA = 0.5  # au-delà de cette fraction de l'écran, rafraîchissement complet
 
-def create_display_image(cover_url=None, album="", artist="", year="", track=""):
-    """
-    Crée une image pour le Kindle avec pochette et infos
+# Pochettes gardées en mémoire par le moteur de rendu
+COVER_CACHE_SIZE = 16
 
-    Args:
-        cover_url: URL de la pochette (ou None pour placeholder)
-        album: Nom de l'album
-        artist: Nom de l'artiste
-        year: Année de sortie
-        track: Titre du morceau en cours
 
-    Returns:
-        PIL.Image en niveaux de gris 600x800
+class KindleRenderer:
+    """
+    Moteur de rendu réutilisable : polices chargées une fois, pochettes
+    en cache (LRU par image_key) et empreinte de la dernière image envoyée
     """
-    # Image de base en niveaux de gris
-    img = Image.new('L', (KINDLE_WIDTH, KINDLE_HEIGHT), color=255)
-    draw = ImageDraw.Draw(img)
-
-    # Marges uniformes
-    margin = 60
-
-    # Zone pochette (carrée, centrée en haut)
-    cover_size = KINDLE_WIDTH - (2 * margin)  # 480px
-    cover_x = margin
-    cover_y = margin
 
-    # Charger la pochette
-    if cover_url:
-        try:
+    def __init__(self, cover_cache_size=COVER_CACHE_SIZE):
+        self.margin = 60
+        self.cover_size = KINDLE_WIDTH - (2 * self.margin)  # 480px
+        self.cover_cache_size = cover_cache_size
+        self._covers = OrderedDict()
+        self._fonts = None
+        self._last_sent = {}  # kindle_ip -> (empreinte, image) affichée
+        self._partials = {}   # kindle_ip -> mises à jour partielles depuis le dernier complet
+        self._devices = {}    # kindle_ip -> verrou de l'écran
+        self._lock = threading.Lock()
+
+    @property
+    def fonts(self):
+        """(large, medium, small), chargées au premier rendu"""
+        if self._fonts is None:
+            try:
+                self._fonts = (
+                    ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 28),
+                    ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 22),
+                    ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18),
+                )
+            except:
+                default = ImageFont.load_default()
+                self._fonts = (default, default, default)
+        return self._fonts
+
+    def cover(self, image_key=None, cover_path=None, cover_url=None):
+        """Pochette 480px en niveaux de gris (LRU par image_key, sinon chemin/URL)"""
+        key = image_key or cover_path or cover_url
+        with self._lock:
+            if key in self._covers:
+                self._covers.move_to_end(key)
+                return self._covers[key]
+
+        if cover_path:
+            cover = Image.open(cover_path)
+        else:
             response = requests.get(cover_url, timeout=10)
             cover = Image.open(BytesIO(response.content))
-            cover = cover.convert('L')  # Niveaux de gris
-            cover = cover.resize((cover_size, cover_size), Image.Resampling.LANCZOS)
-            img.paste(cover, (cover_x, cover_y))
-        except Exception as e:
-            # Placeholder si erreur
+        cover = cover.convert('L')  # Niveaux de gris
+        if cover.size != (self.cover_size, self.cover_size):
+            cover = cover.resize((self.cover_size, self.cover_size), Image.Resampling.LANCZOS)
+
+        with self._lock:
+            self._covers[key] = cover
+            while len(self._covers) > self.cover_cache_size:
+                self._covers.popitem(last=False)
+        return cover
+
+    def render(self, cover_url=None, album="", artist="", year="", track="", cover_path=None, image_key=None):
+        """
+        Crée une image pour le Kindle avec pochette et infos
+
+        Args:
+            cover_url: URL de la pochette (ou None pour placeholder)
+            album: Nom de l'album
+            artist: Nom de l'artiste
+            year: Année de sortie
+            track: Titre du morceau en cours
+            cover_path: Fichier local de la pochette (cache), prioritaire sur cover_url
+            image_key: Clé Roon de la pochette (clé du cache mémoire)
+
+        Returns:
+            PIL.Image en niveaux de gris 600x800
+        """
+        # Image de base en niveaux de gris
+        img = Image.new('L', (KINDLE_WIDTH, KINDLE_HEIGHT), color=255)
+        draw = ImageDraw.Draw(img)
+
+        # Marges uniformes
+        margin = self.margin
+
+        # Zone pochette (carrée, centrée en haut)
+        cover_size = self.cover_size
+        cover_x = margin
+        cover_y = margin
+
+        # Charger la pochette
+        if cover_path or cover_url:
+            try:
+                img.paste(self.cover(image_key, cover_path, cover_url), (cover_x, cover_y))
+            except Exception as e:
+                # Placeholder si erreur
+                draw.rectangle([cover_x, cover_y, cover_x + cover_size, cover_y + cover_size],
+                               outline=0, width=2)
+                draw.text((cover_x + 160, cover_y + 220), "No Cover", fill=128)
+        else:
+            # Placeholder
             draw.rectangle([cover_x, cover_y, cover_x + cover_size, cover_y + cover_size],
                            outline=0, width=2)
-            draw.text((cover_x + 160, cover_y + 220), "No Cover", fill=128)
-    else:
-        # Placeholder
-        draw.rectangle([cover_x, cover_y, cover_x + cover_size, cover_y + cover_size],
-                       outline=0, width=2)
-
-    # Polices
-    try:
-        font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 28)
-        font_medium = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 22)
-        font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18)
-    except:
-        font_large = ImageFont.load_default()
-        font_medium = font_large
-        font_small = font_large
-
-    # Position du texte (sous la pochette, aligné à gauche avec la pochette)
-    text_x = margin
-    text_y = cover_y + cover_size + 20
-    max_width = KINDLE_WIDTH - (2 * margin)
-
-    # Album (gras)
-    if album:
-        album_text = truncate_text(album, font_large, max_width, draw)
-        draw.text((text_x, text_y), album_text, font=font_large, fill=0)
-        text_y += 36
-
-    # Artiste
-    if artist:
-        artist_text = truncate_text(artist, font_medium, max_width, draw)
-        draw.text((text_x, text_y), artist_text, font=font_medium, fill=60)
-        text_y += 30
-
-    # Année
-    if year:
-        draw.text((text_x, text_y), str(year), font=font_small, fill=100)
-        text_y += 28
-
-    # Séparateur si track présent
-    if track:
-        text_y += 5
-        draw.line([(text_x, text_y), (KINDLE_WIDTH - margin, text_y)], fill=180, width=1)
-        text_y += 12
-
-        # Morceau en cours
-        track_text = truncate_text(f"♪ {track}", font_medium, max_width, draw)
-        draw.text((text_x, text_y), track_text, font=font_medium, fill=0)
-
-    return img
+
+        # Polices
+        font_large, font_medium, font_small = self.fonts
+
+        # Position du texte (sous la pochette, aligné à gauche avec la pochette)
+        text_x = margin
+        text_y = cover_y + cover_size + 20
+        max_width = KINDLE_WIDTH - (2 * margin)
+
+        # Album (gras)
+        if album:
+            album_text = truncate_text(album, font_large, max_width, draw)
+            draw.text((text_x, text_y), album_text, font=font_large, fill=0)
+            text_y += 36
+
+        # Artiste
+        if artist:
+            artist_text = truncate_text(artist, font_medium, max_width, draw)
+            draw.text((text_x, text_y), artist_text, font=font_medium, fill=60)
+            text_y += 30
+
+        # Année
+        if year:
+            draw.text((text_x, text_y), str(year), font=font_small, fill=100)
+            text_y += 28
+
+        # Séparateur si track présent
+        if track:
+            text_y += 5
+            draw.line([(text_x, text_y), (KINDLE_WIDTH - margin, text_y)], fill=180, width=1)
+            text_y += 12
+
+            # Morceau en cours
+            track_text = truncate_text(f"♪ {track}", font_medium, max_width, draw)
+            draw.text((text_x, text_y), track_text, font=font_medium, fill=0)
+
+        return img
+
+    def is_displayed(self, image, kindle_ip):
+        """True si cette image est déjà affichée sur ce Kindle"""
+        last = self._last_sent.get(kindle_ip)
+        return last is not None and last[0] == frame_hash(image)
+
+    def changed_region(self, image, kindle_ip):
+        """
+        Zone (x0, y0, x1, y1) qui diffère de la dernière image envoyée,
+        ou None si un rafraîchissement complet est nécessaire
+        """
+        last = self._last_sent.get(kindle_ip)
+        if last is None or self._partials.get(kindle_ip, 0) >= FULL_REFRESH_EVERY:
+            return None
+        bbox = ImageChops.difference(last[1], image).getbbox()
+        if not bbox:
+            return None
+
+        # Aligner horizontalement sur 8 px (mise à jour e-ink)
+        x0, y0, x1, y1 = bbox
+        x0, x1 = x0 - x0 % 8, min(KINDLE_WIDTH, x1 + (-x1) % 8)
+        if (x1 - x0) * (y1 - y0) > PARTIAL_MAX_AREA * KINDLE_WIDTH * KINDLE_HEIGHT:
+            return None
+        return x0, y0, x1, y1
+
+    def mark_displayed(self, image, kindle_ip, partial=False):
+        self._last_sent[kindle_ip] = (frame_hash(image), image)
+        self._partials[kindle_ip] = self._partials.get(kindle_ip, 0) + 1 if partial else 0
+
+    def device_lock(self, kindle_ip):
+        """Un seul rendu/envoi à la fois par Kindle (les fichiers distants sont partagés)"""
+        with self._lock:
+            return self._devices.setdefault(kindle_ip, threading.Lock())
+
+    def forget(self, kindle_ip):
+        """L'écran a changé hors du moteur (effacement...)"""
+        self._last_sent.pop(kindle_ip, None)
+        self._partials.pop(kindle_ip, None)
+
+
+def frame_hash(image):
+    """Empreinte des pixels d'une image"""
+    return hashlib.sha1(image.tobytes()).hexdigest()
+
+
+def create_display_image(cover_url=None, album="", artist="", year="", track="", cover_path=None, image_key=None):
+    """Crée une image pour le Kindle (voir KindleRenderer.render)"""
+    return renderer.render(cover_url, album, artist, year, track, cover_path, image_key)
 
 
 def truncate_text(text, font, max_width, draw):
-    """Tronque le texte avec ... si trop long"""
+    """Tronque le texte avec ... si trop long (recherche dichotomique)"""
     if draw.textlength(text, font=font) <= max_width:
         return text
 
-    while draw.textlength(text + "...", font=font) > max_width and len(text) > 0:
-        text = text[:-1]
+    # Plus long préfixe qui tient avec "..."
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if draw.textlength(text[:mid] + "...", font=font) <= max_width:
+            lo = mid
+        else:
+            hi = mid - 1
 
-    return text + "..."
+    return text[:lo] + "..."
 
 
 def send_to_kindle(image, kindle_ip=KINDLE_IP):
     """
-    Envoie l'image au Kindle et l'affiche
+    Envoie l'image au Kindle et l'affiche (session SSH persistante, image sur stdin)
 
     Args:
         image: PIL.Image ou chemin vers fichier PNG
         kindle_ip: Adresse IP du Kindle
     """
-    # Sauvegarder temporairement si c'est une image PIL
     if isinstance(image, Image.Image):
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
-            temp_path = f.name
-            image.save(temp_path, 'PNG')
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        data = buffer.getvalue()
     else:
-        temp_path = image
+        with open(image, 'rb') as f:
+            data = f.read()
 
-    try:
-        # Copier l'image sur le Kindle
-        subprocess.run([
-            'scp', '-o', 'StrictHostKeyChecking=no',
-            temp_path,
-            f'{KINDLE_USER}@{kindle_ip}:{KINDLE_IMAGE_PATH}'
-        ], check=True, capture_output=True)
-
-        # Désactiver la veille + afficher l'image en plein écran
-        subprocess.run([
-            'ssh', '-o', 'StrictHostKeyChecking=no',
-            f'{KINDLE_USER}@{kindle_ip}',
-            f'lipc-set-prop com.lab126.powerd preventScreenSaver 1; eips -c; eips -f -g {KINDLE_IMAGE_PATH}'
-        ], check=True, capture_output=True)
+    # Copier l'image, désactiver la veille et l'afficher en plein écran, en un seul appel
+    ok = get_host(kindle_ip, KINDLE_USER).put(
+        data, KINDLE_IMAGE_PATH,
+        then=f'lipc-set-prop com.lab126.powerd preventScreenSaver 1; eips -c; eips -f -g {KINDLE_IMAGE_PATH}'
+    )
+    if not ok:
+        print(f"Erreur Kindle: envoi vers {kindle_ip} impossible")
+    return ok
 
-        return True
 
-    except subprocess.CalledProcessError as e:
-        print(f"Erreur Kindle: {e}")
-        return False
+def send_region_to_kindle(image, region, kindle_ip=KINDLE_IP):
+    """
+    Envoie seulement une zone de l'image, affichée sans flash (eips sans -f)
 
-    finally:
-        # Nettoyer le fichier temporaire
-        if isinstance(image, Image.Image) and os.path.exists(temp_path):
-            os.unlink(temp_path)
+    Args:
+        image: PIL.Image complète 600x800
+        region: (x0, y0, x1, y1) à mettre à jour
+        kindle_ip: Adresse IP du Kindle
+    """
+    x0, y0 = region[:2]
+    buffer = BytesIO()
+    image.crop(region).save(buffer, 'PNG')
+    ok = get_host(kindle_ip, KINDLE_USER).put(
+        buffer.getvalue(), KINDLE_PARTIAL_PATH,
+        then=f'eips -g {KINDLE_PARTIAL_PATH} -x {x0} -y {y0}'
+    )
+    if not ok:
+        print(f"Erreur Kindle: mise à jour partielle vers {kindle_ip} impossible")
+    return ok
 
 
-def update_kindle_display(cover_url=None, album="", artist="", year="", track="", kindle_ip=KINDLE_IP):
+def update_kindle_display(cover_url=None, album="", artist="", year="", track="", kindle_ip=KINDLE_IP,
+                          cover_path=None, image_key=None, force=False):
     """
     Fonction principale - crée et envoie l'affichage au Kindle
 
@@ -177,25 +292,39 @@ def update_kindle_display(cover_url=None, album="", artist="", year="", track=""
         year: Année
         track: Morceau en cours
         kindle_ip: IP du Kindle
+        cover_path: Fichier local de la pochette (cache)
+        image_key: Clé Roon de la pochette
+        force: Envoyer même si l'image est identique à celle affichée
 
     Returns:
-        bool: True si succès
+        bool: True si succès (ou image déjà affichée)
     """
-    img = create_display_image(cover_url, album, artist, year, track)
-    return send_to_kindle(img, kindle_ip)
+    # KindleWatcher et update_kindle_async peuvent arriver en même temps : le diff
+    # doit porter sur l'image réellement à l'écran
+    with renderer.device_lock(kindle_ip):
+        img = renderer.render(cover_url, album, artist, year, track, cover_path, image_key)
+        if not force and renderer.is_displayed(img, kindle_ip):
+            return True
+
+        # Seul le morceau a changé : mise à jour partielle de la zone modifiée
+        region = None if force else renderer.changed_region(img, kindle_ip)
+        if region:
+            ok = send_region_to_kindle(img, region, kindle_ip)
+        else:
+            ok = send_to_kindle(img, kindle_ip)
+        if ok:
+            renderer.mark_displayed(img, kindle_ip, partial=region is not None)
+        return ok
 
 
 def clear_kindle_display(kindle_ip=KINDLE_IP):
     """Efface l'écran du Kindle"""
-    try:
-        subprocess.run([
-            'ssh', '-o', 'StrictHostKeyChecking=no',
-            f'{KINDLE_USER}@{kindle_ip}',
-            'eips -c'
-        ], check=True, capture_output=True)
-        return True
-    except:
-        return False
+    with renderer.device_lock(kindle_ip):
+        renderer.forget(kindle_ip)
+        return get_host(kindle_ip, KINDLE_USER).run('eips -c')
+
+
+renderer = KindleRenderer()
 
 
 # Test
@@ -1,57 +1,143 @@
 #!/usr/bin/env python3
-"""NFC Roon Controller - NFC Card Reader (ACR122U)"""
+"""NFC Roon Controller - NFC Card Readers (ACR122U, one or more)"""
+import json
+import os
+import queue
 import time
+import threading
+import uuid
 import requests
 from smartcard.System import readers
+from smartcard.CardMonitoring import CardMonitor, CardObserver
+from smartcard.ReaderMonitoring import ReaderMonitor, ReaderObserver
 from smartcard.util import toHexString
 from smartcard.Exceptions import NoCardException, CardConnectionException
+from badge_socket import BadgeClient
 
 # Configuration
 SERVER_URL = "http://localhost:5001/badge"
-POLL_INTERVAL = 0.3  # seconds between scans
-DEBOUNCE_TIME = 2.0  # seconds before re-reading same card
+TRACES_URL = "http://localhost:5001/api/debug/traces"
+USE_LOCAL_SOCKET = True  # same host as serveur.py: Unix socket first, HTTP as fallback
 
+# Reader name (or part of it) -> {"id": "kitchen", "zone": "Kitchen"}
+# Readers not listed use their PC/SC name as ID and the server's default zone.
+READERS_FILE = "readers.json"
 
-class NFCReader:
-    """NFC card reader using ACR122U"""
-    
-    def __init__(self):
-        self.last_uid = None
-        self.last_time = 0
-        self.reader = None
 
-    def connect(self):
-        """Connect to NFC reader"""
+def load_reader_config(path=READERS_FILE) -> dict:
+    """Load per-reader IDs and zones"""
+    if os.path.exists(path):
         try:
-            r = readers()
-            if not r:
-                print("[NFC] No reader found")
-                return False
-            self.reader = r[0]
-            print(f"[NFC] Reader: {self.reader}")
-            
-            # Disable buzzer
-            try:
-                conn = self.reader.createConnection()
-                conn.connect()
-                conn.transmit([0xFF, 0x00, 0x52, 0x00, 0x00])
-                conn.disconnect()
-                print("[NFC] Buzzer disabled")
-            except:
-                pass
-            
-            return True
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
         except Exception as e:
-            print(f"[NFC] Error: {e}")
-            return False
+            print(f"[NFC] Invalid {path}: {e}")
+    return {}
+
+
+class ReaderSlot:
+    """One attached reader: its ID, its zone and a worker handling its taps"""
+
+    def __init__(self, name, reader_id, zone, handler):
+        self.name = name
+        self.id = reader_id
+        self.zone = zone
+        self.last_uid = None
+        self.events = queue.Queue()
+        self._handler = handler
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self):
+        # Insert/remove events are handled in order, one reader never waits for another
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            try:
+                self._handler(self, *event)
+            except Exception as e:
+                print(f"[NFC] {self.id}: error: {e}")
+
+    def close(self):
+        self.events.put(None)
 
-    def read_uid(self):
-        """Read UID from card"""
+
+class _ReaderWatcher(ReaderObserver):
+    """Hot-plug: forwards reader add/remove to NFCReader"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def update(self, observable, actions):
+        added, removed = actions
+        for reader in removed:
+            self.owner.detach(str(reader))
+        for reader in added:
+            self.owner.attach(reader)
+
+
+class NFCReader(CardObserver):
+    """
+    NFC card readers using ACR122U
+
+    Insert/remove events come from PC/SC (SCardGetStatusChange via
+    CardMonitor): nothing runs while no card moves, and a card is
+    processed once per insertion. Every attached reader is watched,
+    readers can be plugged or unplugged while running.
+    """
+
+    def __init__(self, config=None):
+        self.config = load_reader_config() if config is None else config
+        self.slots = {}
+        self._lock = threading.Lock()
+        # Persistent transports: no connection setup per tap
+        self.session = requests.Session()
+        self.client = BadgeClient(self.on_reply) if USE_LOCAL_SOCKET else None
+
+    def _settings_for(self, name):
+        for pattern, settings in self.config.items():
+            if pattern in name:
+                return settings.get("id") or name, settings.get("zone")
+        return name, None
+
+    def attach(self, reader):
+        """Start watching a reader"""
+        name = str(reader)
+        with self._lock:
+            if name in self.slots:
+                return
+            reader_id, zone = self._settings_for(name)
+            self.slots[name] = ReaderSlot(name, reader_id, zone, self.handle)
+        print(f"[NFC] Reader: {name} (id: {reader_id}, zone: {zone or 'default'})")
+
+        # Disable buzzer
         try:
-            connection = self.reader.createConnection()
+            conn = reader.createConnection()
+            conn.connect()
+            conn.transmit([0xFF, 0x00, 0x52, 0x00, 0x00])
+            conn.disconnect()
+            print("[NFC] Buzzer disabled")
+        except:
+            pass
+
+    def detach(self, name):
+        """Forget an unplugged reader"""
+        with self._lock:
+            slot = self.slots.pop(name, None)
+        if slot:
+            slot.close()
+            print(f"[NFC] Reader removed: {slot.id}")
+
+    def read_uid(self, card):
+        """Read UID from an inserted card"""
+        try:
+            connection = card.createConnection()
             connection.connect()
-            # GET UID command for ISO 14443-A cards
-            data, sw1, sw2 = connection.transmit([0xFF, 0xCA, 0x00, 0x00, 0x00])
+            try:
+                # GET UID command for ISO 14443-A cards
+                data, sw1, sw2 = connection.transmit([0xFF, 0xCA, 0x00, 0x00, 0x00])
+            finally:
+                connection.disconnect()
             if sw1 == 0x90 and sw2 == 0x00:
                 return toHexString(data).replace(" ", "")
         except (NoCardException, CardConnectionException):
@@ -60,22 +146,67 @@ class NFCReader:
             pass
         return None
 
-    def should_process(self, uid):
-        """Check if card should be processed (debounce)"""
-        now = time.time()
-        if uid == self.last_uid and (now - self.last_time) < DEBOUNCE_TIME:
+    def should_process(self, slot, uid):
+        """Check if card should be processed (debounce: once until it is removed)"""
+        if uid == slot.last_uid:
             return False
-        self.last_uid = uid
-        self.last_time = now
+        slot.last_uid = uid
         return True
 
-    def send_to_server(self, uid):
-        """Send UID to server"""
+    def update(self, observable, actions):
+        """CardMonitor callback: (added cards, removed cards), dispatched per reader"""
+        added, removed = actions
+        for kind, cards in (("removed", removed), ("added", added)):
+            for card in cards:
+                with self._lock:
+                    slot = self.slots.get(str(card.reader))
+                if slot:
+                    slot.events.put((kind, card))
+
+    def handle(self, slot, kind, card):
+        """Runs in the reader's worker thread"""
+        if kind == "removed":
+            # Card removed, allow re-scan
+            slot.last_uid = None
+            return
+        t0 = time.perf_counter()
+        uid = self.read_uid(card)
+        read_ms = (time.perf_counter() - t0) * 1000
+        if uid and self.should_process(slot, uid):
+            print(f"[NFC] Card detected: {uid} ({slot.id})")
+            self.send_to_server(uid, uuid.uuid4().hex[:12], read_ms, slot)
+
+    def send_to_server(self, uid, trace_id=None, read_ms=None, slot=None):
+        """Send UID to server (with reader ID/zone, tap trace ID and read time)"""
+        params = {"uid": uid}
+        if slot:
+            params["reader"] = slot.id
+            if slot.zone:
+                params["zone"] = slot.zone
+        if trace_id:
+            params.update(trace=trace_id, read_ms=round(read_ms, 3))
+
+        # Local socket: the reply is logged by on_reply, the reader is free at once
+        params["sent"] = time.perf_counter()
+        if self.client and self.client.send(params):
+            return
+
+        try:
+            response = self.session.get(SERVER_URL, params={k: v for k, v in params.items() if k != "sent"}, timeout=5)
+            self.on_reply(params, response.json())
+        except requests.exceptions.ConnectionError:
+            print("[NFC] Server unavailable")
+        except Exception as e:
+            print(f"[NFC] Error: {e}")
+
+    def on_reply(self, params, data):
+        """Log the outcome of a tap (and report its round trip)"""
+        uid = params["uid"]
+        if params.get("trace"):
+            self.report_span(params["trace"], "send_to_server", (time.perf_counter() - params["sent"]) * 1000)
         try:
-            response = requests.get(f"{SERVER_URL}?uid={uid}", timeout=5)
-            data = response.json()
             status = data.get("status", "unknown")
-            
+
             if status == "playing":
                 print(f"[NFC] {uid} -> Playing")
             elif status == "control":
@@ -84,42 +215,40 @@ class NFCReader:
                 print(f"[NFC] {uid} -> Not programmed")
             else:
                 print(f"[NFC] {uid} -> Error: {data.get('message', status)}")
-                
-        except requests.exceptions.ConnectionError:
-            print("[NFC] Server unavailable")
         except Exception as e:
             print(f"[NFC] Error: {e}")
 
+    def report_span(self, trace_id, stage, ms):
+        """Report a reader-side span to the server without blocking the next scan"""
+        def post():
+            try:
+                self.session.post(TRACES_URL, json={"trace": trace_id, "spans": [{"stage": stage, "ms": ms}]}, timeout=2)
+            except Exception:
+                pass
+        threading.Thread(target=post, daemon=True).start()
+
     def run(self):
         """Main loop"""
         print("[NFC] Starting...")
-        
-        while not self.connect():
-            print("[NFC] Retrying in 5s...")
-            time.sleep(5)
-        
+        if not readers():
+            print("[NFC] No reader found, waiting for one...")
+
+        # Reader monitor reports already attached readers on registration
+        reader_monitor = ReaderMonitor()
+        watcher = _ReaderWatcher(self)
+        reader_monitor.addObserver(watcher)
+
         print("[NFC] Waiting for cards...")
-        
-        while True:
-            try:
-                uid = self.read_uid()
-                
-                if uid and self.should_process(uid):
-                    print(f"[NFC] Card detected: {uid}")
-                    self.send_to_server(uid)
-                elif not uid:
-                    # Card removed, allow re-scan
-                    if self.last_uid:
-                        self.last_uid = None
-                
-                time.sleep(POLL_INTERVAL)
-                
-            except KeyboardInterrupt:
-                print("[NFC] Stopped")
-                break
-            except Exception as e:
-                print(f"[NFC] Error: {e}")
-                time.sleep(1)
+        monitor = CardMonitor()
+        monitor.addObserver(self)
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            print("[NFC] Stopped")
+        finally:
+            monitor.deleteObserver(self)
+            reader_monitor.deleteObserver(watcher)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""NFC Roon Controller - Printable PDF of card covers"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+FETCH_WORKERS = 6     # concurrent cover downloads
+CACHED_PDFS = 4       # recent exports kept in memory
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def grid(page_size, cover_size, margin, spacing) -> tuple:
+    """(cols, rows) of covers fitting on one page"""
+    width, height = page_size
+    cols = int((width - 2 * margin + spacing) / (cover_size + spacing))
+    rows = int((height - 2 * margin + spacing) / (cover_size + spacing))
+    return cols, rows
+
+
+def parse_pages(spec: str) -> tuple | None:
+    """"3" -> (3, 3), "2-4" -> (2, 4), "" -> None"""
+    if not spec:
+        return None
+    first, _, last = spec.partition("-")
+    first = max(1, int(first))
+    return first, max(first, int(last or first))
+
+
+def export_key(cards: list) -> str:
+    """Hash of everything that changes the output"""
+    payload = json.dumps([[c.get("image_key"), c.get("title")] for c in cards])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def build_pdf(cards: list, cover_path, pages=None) -> bytes:
+    """Covers 4.5 cm wide on A4; cover_path(image_key) returns a local print-size file"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import cm
+    from reportlab.lib.utils import ImageReader
+
+    # Settings
+    COVER_SIZE = 4.5 * cm
+    MARGIN = 1 * cm
+    SPACING = 0.3 * cm
+
+    cols, rows = grid(A4, COVER_SIZE, MARGIN, SPACING)
+    if pages:
+        per_page = cols * rows
+        cards = cards[(pages[0] - 1) * per_page:pages[1] * per_page]
+
+    key = export_key(cards)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    x_start = MARGIN
+    y_start = height - MARGIN - COVER_SIZE
+
+    col = 0
+    row = 0
+    complete = True
+
+    # Covers download in parallel; map() yields them in order as soon as ready
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        paths = pool.map(lambda card: cover_path(card.get("image_key")), cards)
+
+        for card, img_path in zip(cards, paths):
+            # Position
+            x = x_start + col * (COVER_SIZE + SPACING)
+            y = y_start - row * (COVER_SIZE + SPACING)
+
+            if img_path:
+                c.drawImage(ImageReader(img_path), x, y, width=COVER_SIZE, height=COVER_SIZE)
+                # Draw thin black border for cutting guide
+                c.setStrokeColorRGB(0, 0, 0)
+                c.setLineWidth(0.5)
+                c.rect(x, y, COVER_SIZE, COVER_SIZE, stroke=1, fill=0)
+            else:
+                complete = False
+                # Draw placeholder with title
+                c.setStrokeColorRGB(0.5, 0.5, 0.5)
+                c.rect(x, y, COVER_SIZE, COVER_SIZE)
+                c.setFont("Helvetica", 8)
+                c.setFillColorRGB(0.3, 0.3, 0.3)
+                title = card.get("title", "?")[:25]
+                c.drawString(x + 5, y + COVER_SIZE / 2, title)
+
+            # Next position
+            col += 1
+            if col >= cols:
+                col = 0
+                row += 1
+                if row >= rows:
+                    c.showPage()
+                    row = 0
+
+    c.save()
+    pdf = buffer.getvalue()
+
+    if not complete:
+        return pdf  # retry missing covers next time
+
+    with _cache_lock:
+        _cache[key] = pdf
+        while len(_cache) > CACHED_PDFS:
+            _cache.popitem(last=False)
+    return pdf
@@ -0,0 +1,108 @@
+"""NFC Roon Controller - Persistent SSH transport to Kindle / Recalbox"""
+import queue
+import subprocess
+import threading
+
+SSH_CONTROL_PATH = "/tmp/nfc-roon-ssh-%C"
+SSH_CONTROL_PERSIST = 600  # seconds the master session stays up when idle
+SSH_TIMEOUT = 10
+SSH_CONNECTION_ERROR = 255  # ssh exit code for transport failures
+
+
+def subprocess_runner(args, input=None, timeout=SSH_TIMEOUT) -> subprocess.CompletedProcess:
+    """Default command runner (tests can inject a fake one)"""
+    return subprocess.run(args, input=input, capture_output=True, timeout=timeout)
+
+
+class RemoteHost:
+    """
+    One long-lived multiplexed SSH session per device (OpenSSH ControlMaster).
+
+    Commands reuse the authenticated master connection instead of a full
+    handshake; queued commands are batched into a single remote shell call.
+    """
+
+    def __init__(self, host: str, user: str = "root", runner=subprocess_runner):
+        self.host = host
+        self.user = user
+        self.runner = runner
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @property
+    def target(self) -> str:
+        return f"{self.user}@{self.host}"
+
+    def ssh_args(self, *extra) -> list:
+        return ["ssh",
+                "-o", "StrictHostKeyChecking=no",
+                "-o", "ConnectTimeout=5",
+                "-o", "ServerAliveInterval=15",
+                "-o", "ControlMaster=auto",
+                "-o", f"ControlPath={SSH_CONTROL_PATH}",
+                "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+                *extra, self.target]
+
+    def run(self, command: str, input: bytes = None, timeout=SSH_TIMEOUT) -> bool:
+        """Run a shell command remotely (stdin = `input`), reconnecting once on failure"""
+        for attempt in range(2):
+            try:
+                result = self.runner(self.ssh_args() + [command], input=input, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                print(f"[SSH] {self.host}: timeout")
+                self.reset()
+                continue
+            if result.returncode != SSH_CONNECTION_ERROR:
+                return result.returncode == 0
+            print(f"[SSH] {self.host}: connection error, reconnecting")
+            self.reset()
+        return False
+
+    def run_batch(self, commands: list, timeout=SSH_TIMEOUT) -> bool:
+        return self.run("; ".join(commands), timeout=timeout) if commands else True
+
+    def put(self, data: bytes, remote_path: str, then: str = "") -> bool:
+        """Stream a file over stdin (no scp, no temp file), optionally followed by a command"""
+        # Grouped: no part of `then` runs if the upload failed
+        command = f"cat > {remote_path}" + (f" && {{ {then}; }}" if then else "")
+        return self.run(command, input=data)
+
+    def submit(self, command: str):
+        """Queue a command without blocking; queued commands are sent together"""
+        with self._lock:
+            self._queue.put(command)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._drain, daemon=True)
+                self._worker.start()
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if self._queue.empty():
+                    self._worker = None
+                    return
+                commands = []
+                while not self._queue.empty():
+                    commands.append(self._queue.get_nowait())
+            self.run_batch(commands)
+
+    def reset(self):
+        """Drop the master session; the next command opens a new one"""
+        try:
+            self.runner(self.ssh_args("-O", "exit"), timeout=5)
+        except Exception:
+            pass
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def get_host(host: str, user: str = "root") -> RemoteHost:
+    """Shared RemoteHost per device"""
+    with _hosts_lock:
+        key = (user, host)
+        if key not in _hosts:
+            _hosts[key] = RemoteHost(host, user)
+        return _hosts[key]
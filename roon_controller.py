@@ -1,12 +1,351 @@
 """NFC Roon Controller - Roon API Integration"""
 from roonapi import RoonApi, RoonDiscovery
+from roonapi.constants import SERVICE_REGISTRY
+from roonapi.roonapisocket import RoonApiWebSocket
+from collections import deque
 from contextlib import contextmanager
+from dataclasses import dataclass, field
+import copy
+import random
+import socket
 import threading
 import time
 from config import APP_INFO, SETTINGS
-from utils import load_token, save_token
+from utils import load_token, save_token, load_core, save_core, clean_artist
+from album_index import Album, AlbumIndex
+from tracing import tracer, traced
+from command_queue import (CommandPipeline, Singleflight, PRIORITY_TAP,
+                           PRIORITY_BROWSE, PRIORITY_BACKGROUND)
 
-_lock = threading.Lock()
+ALBUM_INDEX_SESSION = "album_index"  # dedicated browse session for the crawler
+ALBUM_INDEX_REFRESH = 600  # seconds between library re-crawls
+ALBUM_PAGE_SIZE = 100
+REF_SESSION = "card_refs"  # browse session used to resolve card references
+PLAYBACK_SESSION = "playback"  # browse session used to play resolved references
+BROWSE_SESSIONS = 3  # concurrent admin browse/search sessions
+BROWSE_PAGE_SIZE = 100
+LIST_CACHE_TTL = 600  # seconds genres/subgenres/playlists are served from cache
+
+# Seconds a command may wait in the queue before it is dropped
+TAP_DEADLINE = 5
+BROWSE_DEADLINE = 15
+
+# Connection breaker: consecutive call failures before reconnecting, then
+# exponential backoff with jitter between attempts (reported "down" after a few)
+FAILURE_THRESHOLD = 3
+RECONNECT_BACKOFF = 1     # first retry delay (s), doubled per attempt
+RECONNECT_BACKOFF_MAX = 60
+DOWN_AFTER_ATTEMPTS = 3
+
+# Liveness: websocket close/error callbacks react at once; a registry ping
+# also catches a socket that stays open on a core that stopped answering
+PING_INTERVAL = 5
+PING_TIMEOUT = 1
+PING_MISSES = 3   # consecutive missed pings before the core counts as gone (busy != dead)
+CORE_PROBE_TIMEOUT = 1  # TCP check of the last known core before trying it
+
+_ref_lock = threading.Lock()
+
+
+def _atomic_request_ids():
+    """roonapi allocates request ids without a lock; concurrent sessions need one"""
+    send_request = RoonApiWebSocket.send_request
+    lock = threading.Lock()
+
+    def locked(self, *args, **kwargs):
+        with lock:
+            return send_request(self, *args, **kwargs)
+    RoonApiWebSocket.send_request = locked
+
+
+_atomic_request_ids()
+
+
+class BrowseSessionPool:
+    """Independent Roon browse sessions (multi_session_key), leased per operation"""
+
+    def __init__(self, size: int):
+        self._free = [f"browse-{i}" for i in range(size)]
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def lease(self):
+        with self._cond:
+            while not self._free:
+                self._cond.wait()
+            key = self._free.pop()
+        try:
+            yield key
+        finally:
+            with self._cond:
+                self._free.append(key)
+                self._cond.notify()
+
+
+class ListCache:
+    """Browse listings by path, expiring after `ttl` seconds"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: tuple) -> list | None:
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, path: tuple, items: list):
+        with self._lock:
+            self._entries[path] = (time.monotonic() + self.ttl, items)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RoonLink:
+    """
+    Connection state machine and circuit breaker.
+
+    connecting (startup) -> connected -> degraded (calls failing) ->
+    reconnecting (breaker open) -> down (still retrying, less often). Until
+    connected, and while the breaker is open, callers get an answer at once
+    instead of waiting on a dead core.
+    """
+
+    CONNECTING, CONNECTED, DEGRADED, RECONNECTING, DOWN = (
+        "connecting", "connected", "degraded", "reconnecting", "down")
+
+    def __init__(self):
+        self.state = self.CONNECTING
+        self.since = time.time()
+        self.reason = None
+        self.failures = 0
+        self.attempts = 0
+        self.retry_at = None
+        self.lost_at = None
+        self.last_outage = None
+        self.transitions = deque(maxlen=20)
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.state in (self.CONNECTED, self.DEGRADED)
+
+    def _set(self, state: str, reason: str = None):
+        if state != self.state:
+            print(f"Roon: {self.state} -> {state}" + (f" ({reason})" if reason else ""))
+            self.transitions.append({"state": state, "at": time.time(), "reason": reason})
+            self.state, self.since = state, time.time()
+        self.reason = reason
+
+    def connected(self):
+        with self._lock:
+            self.failures = self.attempts = 0
+            self.retry_at = None
+            if self.lost_at:
+                self.last_outage = time.time() - self.lost_at
+                self.lost_at = None
+                print(f"Roon back after {self.last_outage:.1f}s")
+            self._set(self.CONNECTED)
+
+    def succeeded(self):
+        """A Roon call went through"""
+        if self.state == self.DEGRADED:
+            with self._lock:
+                self.failures = 0
+                self._set(self.CONNECTED)
+
+    def failed(self, error) -> bool:
+        """A Roon call failed; True when the breaker opens (reconnect needed)"""
+        with self._lock:
+            if not self.available:
+                return False
+            self.failures += 1
+            if self.failures < FAILURE_THRESHOLD:
+                self._set(self.DEGRADED, str(error))
+                return False
+            self.lost_at = time.time()
+            self._set(self.RECONNECTING, f"{self.failures} failed calls: {error}")
+            return True
+
+    def lost(self, reason: str) -> bool:
+        """Connection lost; True if it was usable until now"""
+        with self._lock:
+            if not self.available:
+                return False
+            self.lost_at = time.time()
+            self._set(self.RECONNECTING, reason)
+            return True
+
+    def attempt_failed(self) -> float:
+        """Seconds to wait before the next reconnection attempt"""
+        with self._lock:
+            self.attempts += 1
+            delay = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF * 2 ** (self.attempts - 1))
+            delay *= random.uniform(0.5, 1.0)   # jitter: several clients do not retry in step
+            self.retry_at = time.time() + delay
+            if self.attempts >= DOWN_AFTER_ATTEMPTS:
+                self._set(self.DOWN, f"{self.attempts} reconnection attempts failed")
+            return delay
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "since": self.since,
+                "reason": self.reason,
+                "failures": self.failures,
+                "attempts": self.attempts,
+                "retry_in": round(max(0, self.retry_at - time.time()), 1) if self.retry_at else None,
+                "last_outage": round(self.last_outage, 2) if self.last_outage is not None else None,
+                "transitions": list(self.transitions),
+            }
+
+
+@dataclass(frozen=True)
+class ZoneIndex:
+    """Zone/output lookups for one snapshot, built once per Roon update"""
+    names: dict = field(default_factory=dict)         # zone_id -> display name
+    by_name: dict = field(default_factory=dict)       # display name -> zone_id
+    outputs: dict = field(default_factory=dict)       # zone_id -> output_ids (grouped outputs)
+    output_zone: dict = field(default_factory=dict)   # output_id -> zone_id
+    output_ids: dict = field(default_factory=dict)    # output display name -> output_id
+
+    @classmethod
+    def build(cls, zones: dict, outputs: dict) -> "ZoneIndex":
+        index = cls()
+        for zid, zone in zones.items():
+            name = zone.get("display_name")
+            index.names[zid] = name
+            index.by_name.setdefault(name, zid)
+            members = tuple(o["output_id"] for o in zone.get("outputs", []) if o.get("output_id"))
+            index.outputs[zid] = members
+            for oid in members:
+                index.output_zone[oid] = zid
+        for oid, output in outputs.items():
+            index.output_ids.setdefault(output.get("display_name"), oid)
+            if output.get("zone_id") in zones:
+                index.output_zone.setdefault(oid, output["zone_id"])
+        return index
+
+    def resolve(self, ref) -> str | None:
+        """Zone ID for a zone ID, zone name, output ID or output name"""
+        if not ref:
+            return None
+        if ref in self.names:
+            return ref
+        return (self.by_name.get(ref) or self.output_zone.get(ref)
+                or self.output_zone.get(self.output_ids.get(ref)))
+
+    def resolve_many(self, refs) -> dict:
+        """{ref: zone_id or None} for a batch of references"""
+        return {ref: self.resolve(ref) for ref in refs}
+
+
+@dataclass(frozen=True)
+class ZoneSnapshot:
+    """Immutable copy of Roon zones and outputs at a given version"""
+    version: int = 0
+    zones: dict = field(default_factory=dict)
+    outputs: dict = field(default_factory=dict)
+    index: ZoneIndex = field(default_factory=ZoneIndex)
+    online: bool = False   # False while Roon is unreachable (zones are then empty)
+
+
+class ZoneStateStore:
+    """
+    Zone/output state pushed by roonapi callbacks, readable without the websocket.
+
+    Zone and output changes publish a new versioned snapshot. Seek ticks
+    (about once per second per playing zone) only update the playback
+    positions and their own seek_version.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._snapshot = ZoneSnapshot()
+        self._api = None
+        self._registered = False
+        self._seek = {}          # zone_id -> seek position newer than the snapshot
+        self.seek_version = 0
+
+    def attach(self, api):
+        """Follow state changes of a (new) RoonApi instance"""
+        self._api = api
+        # roonapi keeps callbacks on the class (shared by every instance): register once
+        if not self._registered:
+            api.register_state_callback(self._on_change)
+            self._registered = True
+        self._refresh()
+
+    def _on_change(self, event, changed_ids):
+        api = self._api
+        if not api:
+            return
+        if event != "zones_seek_changed":
+            self._refresh(changed_ids if event == "zones_changed" else ())
+            return
+        try:
+            positions = {zid: api.zones[zid].get("seek_position") for zid in changed_ids if zid in api.zones}
+        except Exception:
+            return
+        with self._cond:
+            self._seek.update(positions)
+            self.seek_version += 1
+            self._cond.notify_all()
+
+    def seek(self, zid: str, default=None):
+        """Latest playback position of a zone"""
+        return self._seek.get(zid, default)
+
+    def detach(self):
+        """Forget the current API instance and publish an empty, offline snapshot"""
+        self._api = None
+        self._publish({}, {}, online=False)
+
+    def _refresh(self, changed_zones=()):
+        api = self._api
+        if not api:
+            return
+        try:
+            zones = copy.deepcopy(api.zones)
+            outputs = copy.deepcopy(api.outputs)
+        except Exception as e:
+            print(f"Zone state refresh error: {e}")
+            return
+        self._publish(zones, outputs, changed_zones=changed_zones)
+
+    def _publish(self, zones: dict, outputs: dict, online: bool = True, changed_zones=None):
+        with self._cond:
+            # The new snapshot carries the current position of the zones it updates
+            if changed_zones is None:
+                self._seek.clear()
+            else:
+                for zid in [z for z in self._seek if z in changed_zones or z not in zones]:
+                    del self._seek[zid]
+            self._snapshot = ZoneSnapshot(self._snapshot.version + 1, zones, outputs,
+                                          ZoneIndex.build(zones, outputs), online)
+            self._cond.notify_all()
+
+    def snapshot(self) -> ZoneSnapshot:
+        """Current consistent copy of zones and outputs"""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def wait_for_change(self, version: int, timeout: float = None, seek_version: int = None) -> ZoneSnapshot:
+        """Block until the version differs from `version` (or timeout); seek ticks
+        also wake the caller when it passes the `seek_version` it last saw"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot.version != version or
+                                (seek_version is not None and self.seek_version != seek_version), timeout)
+            return self._snapshot
 
 
 class RoonController:
@@ -14,37 +353,92 @@ class RoonController:
     
     def __init__(self):
         self.api = None
-        self._zone_cache = {}
+        self.state = ZoneStateStore()
+        self.link = RoonLink()
         self._reconnect_thread = None
+        self._recovery_thread = None
+        self._recovery_lock = threading.Lock()
+        self._recovery_wake = threading.Event()
+        self._liveness = threading.Event()   # set by socket errors: ping now
+        self._index_thread = None
+        # One worker per browse session, plus one that only runs taps and controls
+        self.commands = CommandPipeline("roon", workers=BROWSE_SESSIONS, tap_workers=1)
+        self.sessions = BrowseSessionPool(BROWSE_SESSIONS)
+        self.lists = ListCache(LIST_CACHE_TTL)
+        self.flights = Singleflight()
+        self._playback_lock = threading.Lock()
+        self._last_search = None
+        self.albums = AlbumIndex()
         self._should_run = True
-        self._last_activity = time.time()
+
+    def start(self):
+        """Connect in the background; the link reports "connecting" until Roon is ready"""
+        self._start_recovery()
 
     def connect(self) -> bool:
-        """Connect to Roon server"""
+        """Connect to Roon server (last known core first, discovery only if it does not answer)"""
         try:
-            servers = RoonDiscovery(None).all()
-            if not servers:
-                print("No Roon server found")
-                return False
-
             token = load_token()
-            self.api = RoonApi(APP_INFO, token, *servers[0])
+            self._retire(self.api)
+            self.api = None
+
+            core = load_core()
+            if core and self._core_reachable(*core):
+                self.api = self._open(token, *core)
+            if not self.api:
+                servers = RoonDiscovery(None).all()
+                if not servers:
+                    print("No Roon server found")
+                    return False
+                core = tuple(servers[0])
+                self.api = self._open(token, *core)
+                if not self.api:
+                    return False
+                save_core(*core)
+
+            self._watch_socket(self.api)
+            tracer.instrument(self.api, ("play_media", "browse_browse", "browse_load"), "roon")
 
             if self.api.token != token:
                 save_token(self.api.token)
                 print("Token saved")
 
-            print(f"Roon connected: {servers[0][0]}:{servers[0][1]}")
-            self._zone_cache.clear()
-            self._last_activity = time.time()
+            print(f"Roon connected: {core[0]}:{core[1]}")
+            self.lists.clear()
+            self.state.attach(self.api)
+            self.link.connected()
             
-            # Start watchdog thread
+            # Start watchdog and library indexing threads
             self._start_watchdog()
+            self._start_album_indexer()
+            self._prefetch_lists()
             return True
         except Exception as e:
             print(f"Roon connection error: {e}")
             return False
 
+    def _core_reachable(self, host, port) -> bool:
+        """Quick TCP check, so a stale address costs a second rather than a socket timeout"""
+        try:
+            socket.create_connection((host, port), timeout=CORE_PROBE_TIMEOUT).close()
+            return True
+        except OSError:
+            print(f"Last Roon core {host}:{port} not reachable, discovering")
+            return False
+
+    def _open(self, token, host, port):
+        """RoonApi for one core, or None if its socket did not come up"""
+        try:
+            api = RoonApi(APP_INFO, token, host, port)
+        except Exception as e:
+            print(f"Roon core {host}:{port}: {e}")
+            return None
+        if getattr(api, "ready", True):
+            return api
+        print(f"Roon core {host}:{port} did not answer")
+        self._retire(api)
+        return None
+
     def _start_watchdog(self):
         """Start connection monitoring thread"""
         if self._reconnect_thread and self._reconnect_thread.is_alive():
@@ -55,126 +449,307 @@ class RoonController:
         self._reconnect_thread.start()
         print("Watchdog started")
 
+    def _start_album_indexer(self):
+        """Start background crawl of Library > Albums"""
+        if self._index_thread and self._index_thread.is_alive():
+            return
+
+        self._index_thread = threading.Thread(target=self._album_index_loop, daemon=True)
+        self._index_thread.start()
+
+    def _album_index_loop(self):
+        """Re-crawl the album library periodically, applying only the differences"""
+        while self._should_run:
+            try:
+                if self._is_connected():
+                    start = time.time()
+                    albums = self._crawl_albums()
+                    if albums is not None:
+                        first_sync = not self.albums.ready
+                        added, removed = self.albums.sync(albums)
+                        if (added or removed) and not first_sync:
+                            self.lists.clear()   # library changed (the first sync only fills the index)
+                        print(f"Album index: {len(self.albums)} albums (+{added} -{removed}) "
+                              f"in {time.time() - start:.1f}s")
+            except Exception as e:
+                print(f"Album index error: {e}")
+            time.sleep(ALBUM_INDEX_REFRESH)
+
+    def _crawl_albums(self) -> list | None:
+        """Page through Library > Albums in a dedicated browse session"""
+        opts = {"hierarchy": "browse", "multi_session_key": ALBUM_INDEX_SESSION}
+
+        run = self._run_background
+        run(self.api.browse_browse, {**opts, "pop_all": True})
+
+        count = 0
+        for title in ("Library", "Albums"):
+            level = run(self.api.browse_load, {**opts, "offset": 0, "count": 50})
+            key = next((i["item_key"] for i in level.get("items", []) if i.get("title") == title), None)
+            if not key:
+                return None
+            count = run(self.api.browse_browse, {**opts, "item_key": key})["list"]["count"]
+
+        albums = []
+        for offset in range(0, count, ALBUM_PAGE_SIZE):
+            page = run(self.api.browse_load, {**opts, "offset": offset, "count": ALBUM_PAGE_SIZE})
+            albums.extend(
+                Album(i["title"], i.get("subtitle", ""), image_key=i.get("image_key") or "")
+                for i in page.get("items", []) if i.get("title")
+            )
+        return albums
+
+    def _run_background(self, func, *args):
+        """One Roon round trip as its own background command: taps run in between"""
+        return self.commands.submit(PRIORITY_BACKGROUND, func, *args).wait()
+
     def _watchdog_loop(self):
-        """Monitor connection every 30 seconds"""
+        """Ping Roon every PING_INTERVAL seconds, at once after a socket error"""
+        misses = 0
         while self._should_run:
-            time.sleep(30)
+            self._liveness.wait(PING_INTERVAL)
+            self._liveness.clear()
             try:
-                if not self._is_connected():
-                    print("Roon connection lost, reconnecting...")
-                    self._reconnect()
+                if not self.link.available or self._ping():
+                    misses = 0
+                else:
+                    misses += 1
+                    print(f"Roon ping missed ({misses}/{PING_MISSES})")
+                    if misses >= PING_MISSES:
+                        misses = 0
+                        self._connection_lost("ping timeout")
+                if not self.link.available:
+                    self._start_recovery()
             except Exception as e:
                 print(f"Watchdog error: {e}")
 
+    def _watch_socket(self, api):
+        """React to the websocket closing or failing instead of waiting for the next check"""
+        sock = getattr(getattr(api, "_roonsocket", None), "_socket", None)
+        if sock is None:
+            return
+        on_close, on_error = sock.on_close, sock.on_error
+
+        def closed(*args):
+            on_close(*args)
+            if api is self.api:
+                self._connection_lost("websocket closed")
+
+        def failed(*args):
+            on_error(*args)
+            if api is self.api:
+                self._liveness.set()
+
+        sock.on_close, sock.on_error = closed, failed
+
     def _is_connected(self) -> bool:
-        """Check if Roon connection is active"""
-        if not self.api:
+        """Websocket open and not failed (no round trip; see _ping)"""
+        sock = getattr(self.api, "_roonsocket", None) if self.api else None
+        if sock is None:
+            return self.api is not None
+        return sock.connected and not sock.failed_state
+
+    def _ping(self, timeout: float = PING_TIMEOUT) -> bool:
+        """Round trip to the core (registry info), bounded by `timeout`"""
+        if not self._is_connected():
             return False
-        try:
-            _ = self.api.zones
+        sock = getattr(self.api, "_roonsocket", None)
+        if sock is None:
             return True
-        except:
+        request_id = sock.send_request(SERVICE_REGISTRY + "/info")
+        if request_id is False:
+            return False
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                if sock.results.get(request_id) is not None:
+                    return True
+                time.sleep(0.02)
             return False
+        finally:
+            sock.results.pop(request_id, None)
+
+    def _connection_lost(self, reason: str):
+        """Outage detected: open the breaker, tell zone subscribers, reconnect now"""
+        if self.link.lost(reason):
+            self._go_offline()
+
+    def _go_offline(self):
+        api = self.api
+        self.state.detach()   # wakes wait_for_zone_change() with an offline snapshot
+        self._retire(api)
+        self._start_recovery()
 
-    def _reconnect(self):
-        """Attempt to reconnect"""
-        for attempt in range(3):
-            print(f"Reconnection attempt {attempt + 1}/3...")
+    def _retire(self, api):
+        """Stop a dead RoonApi instance (and its own 20 s reconnect watcher)"""
+        if api is None:
+            return
+        try:
+            api.stop()
+        except Exception:
+            pass
+
+    def _recover(self):
+        """Reconnect with exponential backoff and jitter (own thread, never a request's)"""
+        while self._should_run and not self.link.available:
+            self._recovery_wake.clear()   # a tap during this attempt is served by it
+            print(f"Roon connection attempt {self.link.attempts + 1}...")
             try:
                 if self.connect():
-                    print("Reconnection successful")
-                    return True
+                    return
             except Exception as e:
                 print(f"Failed: {e}")
-            time.sleep(5)
-        print("Reconnection failed after 3 attempts")
-        return False
+            delay = self.link.attempt_failed()
+            print(f"Next reconnection attempt in {delay:.1f}s")
+            self._recovery_wake.wait(delay)
+
+    def _start_recovery(self, retry_now=False):
+        """Start the reconnection loop unless it is already running;
+        `retry_now` cuts the current backoff short (someone is waiting on Roon)"""
+        with self._recovery_lock:
+            if self._recovery_thread and self._recovery_thread.is_alive():
+                if retry_now:
+                    self._recovery_wake.set()
+                return
+            self._recovery_wake.clear()
+            self._recovery_thread = threading.Thread(target=self._recover, daemon=True)
+            self._recovery_thread.start()
 
     def _ensure_connected(self) -> bool:
-        """Ensure connection is active before operation"""
-        if self._is_connected():
-            self._last_activity = time.time()
+        """Ensure connection is active before operation (fails fast while the breaker is open)"""
+        if self.link.available and self._is_connected():
             return True
-        return self._reconnect()
+        self._connection_lost("connection lost")
+        self._start_recovery(retry_now=True)
+        return False
 
-    def _get_zone_id(self, ref=None) -> str | None:
-        """Resolve zone_id from name or ID"""
-        if not self._ensure_connected():
-            return None
+    def _call_failed(self, error):
+        """Count a failed Roon call; reconnect once the breaker opens"""
+        if self.link.failed(error):
+            self._go_offline()
 
-        # Direct ID
-        if ref and ref in self.api.zones:
-            return ref
+    @property
+    def available(self) -> bool:
+        """Roon usable right now (connected or degraded); reconnects in the background if not"""
+        if self.link.available:
+            return True
+        self._start_recovery()
+        return False
 
-        # Search by name (with cache)
-        if ref:
-            if ref in self._zone_cache:
-                cached = self._zone_cache[ref]
-                if cached in self.api.zones:
-                    return cached
-                del self._zone_cache[ref]
-            
-            for zid, z in self.api.zones.items():
-                if z.get("display_name") == ref:
-                    self._zone_cache[ref] = zid
-                    return zid
-
-        # Default zone from settings
-        default_zone = SETTINGS.get("default_zone", "")
-        if default_zone:
-            for zid, z in self.api.zones.items():
-                if z.get("display_name") == default_zone:
-                    return zid
+    @traced("roon._get_zone_id")
+    def _get_zone_id(self, ref=None, fallback=None) -> str | None:
+        """Resolve zone_id (card zone, then reader zone, then default zone from settings)"""
+        index = self.state.snapshot().index
+        for candidate in (ref, fallback, SETTINGS.get("default_zone", "")):
+            zid = index.resolve(candidate)
+            if zid:
+                return zid
 
         # First available
-        return next(iter(self.api.zones), None)
+        return next(iter(index.names), None)
+
+    def zone_name_for(self, zone_id=None, reader_zone=None) -> str | None:
+        """Name of the zone a tap with this card zone / reader zone plays in"""
+        return self.get_zone_name(self._get_zone_id(zone_id, reader_zone))
 
     def get_zone_name(self, zid: str) -> str | None:
         """Get zone name from ID"""
-        try:
-            if self._ensure_connected() and zid and zid in self.api.zones:
-                return self.api.zones[zid].get("display_name")
-        except:
-            pass
-        return None
+        return self.state.snapshot().index.names.get(zid) if zid else None
+
+    def get_zone_names(self, refs) -> dict:
+        """{ref: zone name or None} for many zone IDs/names, from one snapshot"""
+        index = self.state.snapshot().index
+        return {ref: index.names.get(zid) for ref, zid in index.resolve_many(refs).items()}
 
     def get_zones(self) -> list:
         """List all zones"""
         if not self._ensure_connected():
             return []
-        try:
-            return [{"zone_id": z, "name": d.get("display_name", "?"), "state": d.get("state", "?")}
-                    for z, d in self.api.zones.items()]
-        except Exception as e:
-            print(f"Error getting zones: {e}")
-            return []
+        return [{"zone_id": z, "name": d.get("display_name", "?"), "state": d.get("state", "?")}
+                for z, d in self.state.snapshot().zones.items()]
+
+    def wait_for_zone_change(self, version: int, timeout: float = None, seek_version: int = None) -> ZoneSnapshot:
+        """Block until Roon pushes a zone/output change newer than `version`
+        (or, with `seek_version`, a playback position tick)"""
+        return self.state.wait_for_change(version, timeout, seek_version)
 
     # === Playback ===
 
-    def play_content(self, content_type: str, data: dict, zone_id=None) -> bool:
-        """Main entry point for playback"""
-        if not self._ensure_connected():
-            print("Roon not connected")
-            return False
+    def play_content(self, content_type: str, data: dict, zone_id=None, reader_zone=None) -> bool:
+        """Main entry point for playback (highest priority command)"""
+        return self.commands.call(PRIORITY_TAP, self._play_content, content_type, data, zone_id, reader_zone,
+                                  timeout=TAP_DEADLINE, default=False)
 
-        zid = self._get_zone_id(zone_id)
-        if not zid:
-            print("Zone not found")
+    def _play_content(self, content_type: str, data: dict, zone_id=None, reader_zone=None) -> bool:
+        # play_media (default session) and PLAYBACK_SESSION are shared by all taps
+        with self._playback_lock:
+            if not self._ensure_connected():
+                print("Roon not connected")
+                return False
+
+            zid = self._get_zone_id(zone_id, reader_zone)
+            if not zid:
+                print("Zone not found")
+                return False
+
+            print(f"Zone: {self.get_zone_name(zid)}")
+
+            ref = data.get("ref")
+            # {"unresolved_at": ...}: the resolver found nothing, browse by name
+            if ref and ref.get("path"):
+                try:
+                    if self._play_ref(ref, zid):
+                        self.link.succeeded()
+                        return True
+                except Exception as e:
+                    print(f"Reference playback error: {e}")
+                    self._call_failed(e)
+                ref["stale"] = True
+                print("Stale Roon reference, falling back to path")
+
+            try:
+                handlers = {
+                    "album": lambda: self._play_album(data.get("title"), data.get("artist"), zid),
+                    "genre": lambda: self._play_genre(data.get("genre"), data.get("subgenre"), zid),
+                    "playlist": lambda: self._play_playlist(data.get("playlist"), zid),
+                }
+                ok = handlers.get(content_type, lambda: False)()
+                if ok:
+                    self.link.succeeded()
+                return ok
+            except Exception as e:
+                print(f"Playback error: {e}")
+                self._call_failed(e)
+                return False
+
+    def _play_ref(self, ref: dict, zid) -> bool:
+        """Play a pre-resolved reference: one exact-offset load per level"""
+        if ref.get("stale") or ref.get("core_id") != self.core_id:
             return False
 
-        print(f"Zone: {self.get_zone_name(zid)}")
+        opts = {"hierarchy": "browse", "zone_or_output_id": zid, "multi_session_key": PLAYBACK_SESSION}
+        self.api.browse_browse({**opts, "pop_all": True})
+        last = len(ref["path"]) - 1
+        for depth, (title, offset) in enumerate(zip(ref["path"], ref["offsets"])):
+            items = self.api.browse_load({**opts, "offset": offset, "count": 1}).get("items", [])
+            if not items or items[0].get("title") != title:
+                return False
+            if depth == last and ref.get("subtitle") and clean_artist(items[0].get("subtitle", "")) != ref["subtitle"]:
+                return False
+            self.api.browse_browse({**opts, "item_key": items[0]["item_key"]})
 
-        try:
-            handlers = {
-                "album": lambda: self._play_album(data.get("title"), data.get("artist"), zid),
-                "genre": lambda: self._play_genre(data.get("genre"), data.get("subgenre"), zid),
-                "playlist": lambda: self._play_playlist(data.get("playlist"), zid),
-            }
-            return handlers.get(content_type, lambda: False)()
-        except Exception as e:
-            print(f"Playback error: {e}")
+        # First item is the play action (or an action list: Play Now, Queue...)
+        items = self.api.browse_load({**opts, "offset": 0, "count": 10}).get("items", [])
+        if items and items[0].get("hint") == "action_list":
+            self.api.browse_browse({**opts, "item_key": items[0]["item_key"]})
+            items = self.api.browse_load({**opts, "offset": 0, "count": 10}).get("items", [])
+        if not items or items[0].get("hint") != "action":
             return False
 
+        self.api.browse_browse({**opts, "item_key": items[0]["item_key"]})
+        print(f"Playing: {' > '.join(ref['path'][-2:])}")
+        return True
+
     def _play_album(self, title, artist, zid) -> bool:
         """Play album with fallback paths"""
         paths = [["Library", "Albums", title], ["Library", "Artists", artist, title]]
@@ -212,40 +787,109 @@ class RoonController:
             print(f"Smart playlist not supported: {playlist}")
             return False
 
+    # === Card references ===
+
+    @property
+    def core_id(self) -> str | None:
+        try:
+            return self.api.core_id if self.api else None
+        except AttributeError:
+            return None
+
+    def resolve_card_ref(self, card: dict) -> dict | None:
+        """Locate a card's content once and return a reference for _play_ref
+        (runs on the caller's thread, one queued command per browse page)"""
+        if not self._is_connected():
+            return None
+
+        ctype = card.get("content_type", "album")
+        if ctype == "album":
+            title, artist = card.get("title"), card.get("artist")
+            candidates = [(["Library", "Artists", artist, title], None),
+                          (["Library", "Albums", title], artist)]
+        elif ctype == "genre":
+            candidates = [(["Genres", card.get("genre")] + ([card["subgenre"]] if card.get("subgenre") else []), None)]
+        elif ctype == "playlist":
+            candidates = [(["Playlists", card.get("playlist")], None)]
+        else:
+            return None
+
+        with _ref_lock:
+            for path, subtitle in candidates:
+                if not all(path):
+                    continue
+                try:
+                    offsets = self._locate(path, subtitle)
+                except Exception as e:
+                    print(f"Reference resolution error: {e}")
+                    offsets = None
+                if offsets:
+                    return {"path": path, "offsets": offsets, "subtitle": subtitle, "core_id": self.core_id}
+        return None
+
+    def _locate(self, path: list, subtitle=None) -> list | None:
+        """Offsets of each path element; `subtitle` disambiguates the last one"""
+        opts = {"hierarchy": "browse", "multi_session_key": REF_SESSION}
+        run = self._run_background
+        count = run(self.api.browse_browse, {**opts, "pop_all": True})["list"]["count"]
+        offsets = []
+        for depth, title in enumerate(path):
+            last = depth == len(path) - 1
+            found = None
+            for offset in range(0, count, ALBUM_PAGE_SIZE):
+                items = run(self.api.browse_load, {**opts, "offset": offset, "count": ALBUM_PAGE_SIZE}).get("items", [])
+                for n, item in enumerate(items):
+                    if item.get("title") == title and not (last and subtitle and clean_artist(item.get("subtitle", "")) != subtitle):
+                        found = (offset + n, item["item_key"])
+                        break
+                if found:
+                    break
+            if not found:
+                return None
+            offsets.append(found[0])
+            count = run(self.api.browse_browse, {**opts, "item_key": found[1]})["list"]["count"]
+        return offsets
+
     # === Controls ===
 
-    def control_playback(self, action: str, value=None, zone_id=None) -> bool:
-        """Control playback (pause/volume)"""
+    def control_playback(self, action: str, value=None, zone_id=None, reader_zone=None) -> bool:
+        """Control playback (pause/volume), same priority as a tap"""
+        return self.commands.call(PRIORITY_TAP, self._control_playback, action, value, zone_id, reader_zone,
+                                  timeout=TAP_DEADLINE, default=False)
+
+    def _control_playback(self, action: str, value=None, zone_id=None, reader_zone=None) -> bool:
         if not self._ensure_connected():
             print("Roon not connected")
             return False
 
-        zid = self._get_zone_id(zone_id)
+        zid = self._get_zone_id(zone_id, reader_zone)
         if not zid:
             print("Zone not found")
             return False
 
         try:
-            zone = self.api.zones.get(zid)
+            zone = self.state.snapshot().zones.get(zid, {})
             print(f"Zone: {zone.get('display_name', zid)}")
 
             if action == "pause":
                 self.api.playback_control(zid, "playpause")
                 print("Pause/Play OK")
+                self.link.succeeded()
                 return True
 
             if action == "volume":
-                outputs = zone.get("outputs", [])
+                outputs = self.state.snapshot().index.outputs.get(zid)
                 if not outputs:
                     print("No output found")
                     return False
 
-                output_id = outputs[0].get("output_id")
+                output_id = outputs[0]
                 vol = int(value) if value is not None else 50
                 print(f"Volume: output={output_id}, value={vol}")
                 
                 self.api.set_volume_percent(output_id, vol)
                 print(f"Volume set: {vol}")
+                self.link.succeeded()
                 return True
 
             if action == "shuffle":
@@ -255,86 +899,125 @@ class RoonController:
                 new_shuffle = not current_shuffle
                 self.api.change_settings(zid, {"shuffle": new_shuffle})
                 print(f"Shuffle: {current_shuffle} -> {new_shuffle}")
+                self.link.succeeded()
                 return True
 
         except Exception as e:
             print(f"Control error: {e}")
+            self._call_failed(e)
         return False
 
-    # === Browse with context manager ===
+    # === Browse listings (paged, cached) ===
 
-    @contextmanager
-    def _browse(self, target: str):
-        """Context manager for browse navigation"""
-        with _lock:
-            try:
-                self.api.browse_browse({"hierarchy": "browse", "pop_all": True})
-                root = self.api.browse_load({"hierarchy": "browse", "offset": 0, "count": 50})
+    def _iter_items(self, opts: dict):
+        """Every item of the current browse level, loaded page by page"""
+        offset = 0
+        while True:
+            page = self.api.browse_load({**opts, "offset": offset, "count": BROWSE_PAGE_SIZE})
+            items = page.get("items", [])
+            yield from items
+            offset += len(items)
+            total = page.get("list", {}).get("count")
+            if len(items) < BROWSE_PAGE_SIZE or (total is not None and offset >= total):
+                return
 
-                key = next((i["item_key"] for i in root.get("items", []) if i.get("title") == target), None)
-                if key:
-                    self.api.browse_browse({"hierarchy": "browse", "item_key": key})
-                    yield self.api.browse_load({"hierarchy": "browse", "offset": 0, "count": 200})
-                else:
-                    yield None
+    def _cached_list(self, path: tuple) -> list:
+        items = self.lists.get(path)
+        if items is not None:
+            return items
+        return self.flights.do(("list", path), lambda: self.commands.call(
+            PRIORITY_BROWSE, self._load_list, path, timeout=BROWSE_DEADLINE, default=[]))
+
+    def _load_list(self, path: tuple) -> list:
+        """Walk `path` from the root in a leased session and list the level it leads to"""
+        items = self.lists.get(path)
+        if items is not None:
+            return items   # loaded by another worker meanwhile
+        if not self._ensure_connected():
+            return []
+
+        with self.sessions.lease() as session:
+            opts = {"hierarchy": "browse", "multi_session_key": session}
+            try:
+                self.api.browse_browse({**opts, "pop_all": True})
+                for title in path:
+                    key = next((i["item_key"] for i in self._iter_items(opts) if i.get("title") == title), None)
+                    if not key:
+                        return []
+                    self.api.browse_browse({**opts, "item_key": key})
+                items = [{"name": i["title"]} for i in self._iter_items(opts) if i.get("title")]
             except Exception as e:
                 print(f"Browse error: {e}")
-                yield None
+                return []
+
+        self.lists.put(path, items)
+        print(f"{' > '.join(path)}: {len(items)} items")
+        return items
+
+    def _prefetch_lists(self):
+        """Warm the listing cache after connecting (background priority)"""
+        for path in (("Genres",), ("Playlists",)):
+            self.commands.submit(PRIORITY_BACKGROUND, self._load_list_once, path)
+        self.commands.submit(PRIORITY_BACKGROUND, self._prefetch_subgenres)
+
+    def _prefetch_subgenres(self):
+        for genre in self._load_list_once(("Genres",)):
+            self.commands.submit(PRIORITY_BACKGROUND, self._load_list_once, ("Genres", genre["name"]))
+
+    def _load_list_once(self, path: tuple) -> list:
+        """_load_list shared with any identical load in flight"""
+        return self.flights.do(("list", path), lambda: self._load_list(path))
 
     def get_genres(self) -> list:
         """List genres"""
-        if not self._ensure_connected():
-            return []
-        with self._browse("Genres") as items:
-            if not items:
-                return []
-            result = [{"name": i["title"]} for i in items.get("items", []) if i.get("title")]
-            print(f"{len(result)} genres found")
-            return result
+        return self._cached_list(("Genres",))
 
     def get_subgenres(self, genre: str) -> list:
         """List subgenres for a genre"""
-        if not self._ensure_connected():
-            return []
-        with self._browse("Genres") as items:
-            if not items:
-                return []
-            key = next((i["item_key"] for i in items.get("items", []) if i.get("title") == genre), None)
-            if not key:
-                return []
-            self.api.browse_browse({"hierarchy": "browse", "item_key": key})
-            sub = self.api.browse_load({"hierarchy": "browse", "offset": 0, "count": 200})
-            result = [{"name": i["title"]} for i in sub.get("items", []) if i.get("title")]
-            print(f"{len(result)} subgenres for {genre}")
-            return result
+        return self._cached_list(("Genres", genre))
 
     def get_playlists(self) -> list:
         """List playlists"""
-        if not self._ensure_connected():
-            return []
-        with self._browse("Playlists") as items:
-            if not items:
-                return []
-            result = [{"name": i["title"]} for i in items.get("items", []) if i.get("title")]
-            print(f"{len(result)} playlists found")
-            return result
+        return self._cached_list(("Playlists",))
 
     def search(self, query: str) -> list:
-        """Search albums"""
-        if not self._ensure_connected() or len(query) < 2:
+        """Search albums (local index once built, Roon search until then)"""
+        if len(query) < 2:
+            return []
+
+        if self.albums.ready:
+            return self.albums.search(query)
+
+        return self.flights.do(("search", query), lambda: self._search_queued(query))
+
+    def _search_queued(self, query: str) -> list:
+        # Type-ahead: a newer query replaces one still waiting in the queue
+        command = self.commands.submit(PRIORITY_BROWSE, self._search_roon, query, timeout=BROWSE_DEADLINE)
+        previous, self._last_search = self._last_search, command
+        if previous:
+            previous.cancel()
+        try:
+            return command.wait()
+        except Exception as e:
+            print(f"Search '{query}' dropped: {str(e) or 'superseded'}")
+            return []
+
+    def _search_roon(self, query: str) -> list:
+        if not self._ensure_connected():
             return []
 
-        with _lock:
+        with self.sessions.lease() as session:
+            opts = {"hierarchy": "search", "multi_session_key": session}
             try:
-                self.api.browse_browse({"hierarchy": "search", "input": query, "pop_all": True})
-                cats = self.api.browse_load({"hierarchy": "search", "offset": 0, "set_display_offset": 0})
+                self.api.browse_browse({**opts, "input": query, "pop_all": True})
+                cats = self.api.browse_load({**opts, "offset": 0, "set_display_offset": 0})
 
                 key = next((i["item_key"] for i in cats.get("items", []) if i.get("title") == "Albums"), None)
                 if not key:
                     return []
 
-                self.api.browse_browse({"hierarchy": "search", "item_key": key})
-                albums = self.api.browse_load({"hierarchy": "search", "offset": 0, "set_display_offset": 0, "count": 20})
+                self.api.browse_browse({**opts, "item_key": key})
+                albums = self.api.browse_load({**opts, "offset": 0, "set_display_offset": 0, "count": 20})
 
                 results = [
                     {"title": i.get("title", ""), "subtitle": i.get("subtitle", ""),
@@ -348,26 +1031,26 @@ class RoonController:
                 print(f"Search error: {e}")
                 return []
 
-    def get_image_url(self, key: str) -> str | None:
-        """Get image URL from key"""
+    def get_image_url(self, key: str, size: int = None) -> str | None:
+        """Get image URL from key (fit in size x size px, roonapi's 500 px by default)"""
         if not self._ensure_connected() or not key:
             return None
         try:
-            return self.api.get_image(key)
+            return self.api.get_image(key, width=size, height=size) if size else self.api.get_image(key)
         except:
             return None
 
     def get_now_playing(self, zone_id=None) -> dict | None:
-        """Get current track information"""
+        """Get current track information (from the zone state store, no Roon request)"""
         if not self._ensure_connected():
             return None
 
         try:
             zid = self._get_zone_id(zone_id)
-            if not zid or zid not in self.api.zones:
+            zone = self.state.snapshot().zones.get(zid) if zid else None
+            if not zone:
                 return None
 
-            zone = self.api.zones[zid]
             now = zone.get("now_playing")
             if not now:
                 return None
@@ -378,7 +1061,7 @@ class RoonController:
                 "album": now.get("three_line", {}).get("line3", ""),
                 "image_key": now.get("image_key", ""),
                 "length": now.get("length", 0),
-                "seek_position": now.get("seek_position"),
+                "seek_position": self.state.seek(zid, now.get("seek_position")),
                 "state": zone.get("state", "stopped"),
                 "zone_name": zone.get("display_name", "")
             }
@@ -1,14 +1,27 @@
 """NFC Roon Controller - Flask Web Server"""
-from flask import Flask, request, render_template, jsonify, redirect
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context, send_file, url_for
 from dataclasses import dataclass, field
 import time
 import socket
+import signal
+import sys
 import logging
-import subprocess
 import threading
+from io import BytesIO
+from datetime import datetime
 from roon_controller import RoonController
-from utils import load_mapping, save_mapping, clean_artist, record_play, get_stats_summary
-from config import SERVER_PORT, SCAN_TIMEOUT, SETTINGS, save_settings, load_settings
+from events import EventBus
+from tracing import tracer
+from artwork_cache import ArtworkCache, SIZES, mimetype
+from pdf_export import build_pdf, parse_pages
+from remote import get_host
+import badge_socket
+from utils import clean_artist
+from stats import StatsRecorder
+from history import ACTIONS
+from card_store import CardStore
+from config import (SERVER_PORT, SCAN_TIMEOUT, SETTINGS, ARTWORK_CACHE_DIR, ARTWORK_CACHE_BYTES,
+                    save_settings, load_settings)
 
 # === AJOUT 1: Import Kindle (avec fallback si non disponible) ===
 try:
@@ -25,6 +38,9 @@ KINDLE_CONFIG = {
     'ip': '192.168.1.63'
 }
 
+# Recalbox (carte "display" : affiche la pochette sur l'écran CRT)
+RECALBOX_IP = '192.168.1.44'
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -49,59 +65,41 @@ class KindleWatcher(threading.Thread):
         self.last_track = None
         self.last_album = None
         self.running = True
-        self.bar_clear_counter = 0
+        self.bar_clear_interval = interval * 3
 
     def run(self):
         # Attendre que le serveur démarre
         time.sleep(5)
 
         # Désactiver la veille et le powerd au démarrage
-        try:
-            subprocess.run([
-                'ssh', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=5',
-                f'root@{self.kindle_ip}',
-                'stop powerd'
-            ], capture_output=True, timeout=10)
+        if get_host(self.kindle_ip).run('stop powerd'):
             logger.info("Kindle: powerd arrêté")
-        except Exception as e:
-            logger.warning(f"Kindle: impossible d'arrêter powerd: {e}")
+        else:
+            logger.warning("Kindle: impossible d'arrêter powerd")
 
+        version = 0
+        last_bar_clear = time.time()
         while self.running:
             try:
                 if KINDLE_AVAILABLE and KINDLE_CONFIG['enabled']:
                     self._check_and_update()
 
-                # Effacer la barre toutes les 10 secondes (toujours, même sans mise à jour)
-                self.bar_clear_counter += 1
-                if self.bar_clear_counter >= 3:
+                # Effacer la barre toutes les ~10 secondes (toujours, même sans mise à jour)
+                if time.time() - last_bar_clear >= self.bar_clear_interval:
                     self._clear_bar()
-                    self.bar_clear_counter = 0
+                    last_bar_clear = time.time()
 
             except Exception as e:
                 logger.debug(f"KindleWatcher error: {e}")
 
-            time.sleep(self.interval)
+            # Réveil dès que Roon pousse un changement de zone ou de sortie, pas sur les
+            # ticks de position (timeout = effacement de la barre)
+            version = self.roon.wait_for_zone_change(version, timeout=self.interval).version
 
     def _clear_bar(self):
-        """Efface la barre noire en haut du Kindle"""
-        try:
-            spaces = " " * 60
-            subprocess.run([
-                'ssh', '-o', 'StrictHostKeyChecking=no', '-o', 'ConnectTimeout=5',
-                f'root@{self.kindle_ip}',
-                f'eips 0 0 "{spaces}"; eips 0 1 "{spaces}"'
-            ], capture_output=True, timeout=10)
-        except:
-            pass
-
-        while self.running:
-            try:
-                if KINDLE_AVAILABLE and KINDLE_CONFIG['enabled']:
-                    self._check_and_update()
-            except Exception as e:
-                logger.debug(f"KindleWatcher error: {e}")
-
-            time.sleep(self.interval)
+        """Efface la barre noire en haut du Kindle (via la session SSH persistante)"""
+        spaces = " " * 60
+        get_host(self.kindle_ip).submit(f'eips 0 0 "{spaces}"; eips 0 1 "{spaces}"')
 
     def _check_and_update(self):
         """Vérifie si le morceau a changé et met à jour le Kindle"""
@@ -120,11 +118,8 @@ class KindleWatcher(threading.Thread):
         self.last_track = current_track
         self.last_album = current_album
 
-        # Récupérer l'URL de la pochette
-        cover_url = None
-        image_key = now_playing.get('image_key')
-        if image_key:
-            cover_url = self.roon.get_image_url(image_key)
+        # Pochette depuis le cache (déjà en 480 px)
+        cover_path = artwork.path(now_playing.get('image_key'), "kindle")
 
         # Chercher l'année dans le mapping (si on a la carte)
         year = ""
@@ -136,7 +131,8 @@ class KindleWatcher(threading.Thread):
         # Mettre à jour le Kindle
         try:
             update_kindle_display(
-                cover_url=cover_url,
+                cover_path=cover_path,
+                image_key=now_playing.get('image_key'),
                 album=current_album,
                 artist=now_playing.get('artist', ''),
                 year=year,
@@ -157,47 +153,168 @@ kindle_watcher = None
 @dataclass
 class State:
     """Centralized application state"""
-    mapping: dict = field(default_factory=load_mapping)
+    mapping: CardStore = field(default_factory=CardStore)
     roon: RoonController = field(default_factory=RoonController)
     last_uid: str = None
     last_time: float = 0
+    last_scans: dict = field(default_factory=dict)  # zone (ou lecteur) -> (uid, heure)
     playing: dict = None
     current_playing: dict = None
 
-    def scan(self, uid: str):
+    def scan(self, uid: str, where: str = None):
         self.last_uid, self.last_time = uid, time.time()
+        self.last_scans[where] = (uid, self.last_time)
+
+    def repeated(self, uid: str, where: str, within: float = 3600) -> bool:
+        """Même carte déjà badgée à cet endroit (zone ou lecteur) depuis moins de `within` s"""
+        last_uid, last_time = self.last_scans.get(where, (None, 0))
+        return uid == last_uid and (time.time() - last_time) < within
 
     def valid_scan(self) -> bool:
         return self.last_uid and (time.time() - self.last_time) < SCAN_TIMEOUT
 
 
 state = State()
+bus = EventBus()
+stats = StatsRecorder(cards=state.mapping)
+artwork = ArtworkCache(state.roon.get_image_url, ARTWORK_CACHE_DIR, ARTWORK_CACHE_BYTES)
+
+
+def now_playing_payload() -> dict:
+    """Track from Roon + card scanned (shared by /api/now-playing and SSE)"""
+    return {"card": state.playing, "track": state.roon.get_now_playing()}
+
+
+def publish_now_playing():
+    bus.publish("now_playing", now_playing_payload())
+
+
+class CardRefResolver(threading.Thread):
+    """Résout en arrière-plan les références Roon des cartes (album/genre/playlist)"""
+
+    def __init__(self, roon_controller, interval=3600, retry_unresolved=6 * 3600):
+        super().__init__(daemon=True)
+        self.roon = roon_controller
+        self.interval = interval
+        self.retry_unresolved = retry_unresolved
+        self.wake = threading.Event()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def request(self, uid: str):
+        """Résoudre cette carte au plus tôt (carte enregistrée, référence périmée)"""
+        with self._lock:
+            self._pending.add(uid)
+        self.wake.set()
+
+    def needs_ref(self, card: dict) -> bool:
+        if card.get("action", "play") != "play":
+            return False
+        ref = card.get("roon_ref")
+        if not ref or ref.get("stale") or ref.get("core_id") != self.roon.core_id:
+            return True
+        # Introuvable lors d'un passage précédent : on ne reparcourt pas avant retry_unresolved
+        return "unresolved_at" in ref and time.time() - ref["unresolved_at"] >= self.retry_unresolved
+
+    def resolve(self, uid: str, card: dict) -> bool:
+        ref = self.roon.resolve_card_ref(card)
+        if state.mapping.get(uid) is not card:
+            return False
+        if not ref:
+            # Roon perdu en cours de route : ce n'est pas la carte qui est introuvable
+            if not self.roon.link.available:
+                return False
+            ref = {"unresolved_at": time.time(), "core_id": self.roon.core_id}
+        state.mapping[uid] = {**card, "roon_ref": ref}
+        return "path" in ref
+
+    def run(self):
+        while True:
+            self.wake.clear()
+            with self._lock:
+                uids, self._pending = self._pending, set()
+            # Réveil par request() : seulement les cartes concernées, sinon passage complet
+            if uids:
+                cards = [(uid, state.mapping.get(uid)) for uid in uids]
+            else:
+                cards = state.mapping.items()
+            resolved = 0
+            for uid, card in cards:
+                if not self.roon.core_id:
+                    break
+                if card and self.needs_ref(card) and self.resolve(uid, card):
+                    resolved += 1
+            if resolved:
+                logger.info(f"Références Roon mises à jour: {resolved} cartes")
+            self.wake.wait(self.interval if self.roon.core_id else 60)
+
+
+class RoonEventBroadcaster(threading.Thread):
+    """Relaie les changements de zones Roon vers les clients SSE"""
+
+    def __init__(self, roon_controller):
+        super().__init__(daemon=True)
+        self.roon = roon_controller
+        self.last_now_playing = None
+        self.last_zones = None
+        self.online = None
+
+    def run(self):
+        version = seek_version = 0
+        while True:
+            # Les ticks de position réveillent aussi (barre de progression de /display)
+            snapshot = self.roon.wait_for_zone_change(version, timeout=30, seek_version=seek_version)
+            version, seek_version = snapshot.version, self.roon.state.seek_version
+            # Coupure / retour de Roon : signalé même sans changement de lecture
+            if snapshot.online != self.online:
+                self.online = snapshot.online
+                bus.publish("roon_status", self.roon.link.status())
+            if not bus.subscriber_count:
+                continue
+            try:
+                payload = now_playing_payload()
+                if payload != self.last_now_playing:
+                    self.last_now_playing = payload
+                    bus.publish("now_playing", payload)
+
+                zones = self.roon.get_zones()
+                if zones != self.last_zones:
+                    self.last_zones = zones
+                    bus.publish("zone_changed", zones)
+            except Exception as e:
+                logger.debug(f"RoonEventBroadcaster error: {e}")
 
 
 # === AJOUT 2: Fonction mise à jour Kindle ===
-def update_kindle_async(card, roon):
-    """Met à jour le Kindle en arrière-plan (ne bloque pas la lecture)"""
+def update_kindle_async(card, force=False):
+    """Met à jour le Kindle en arrière-plan (ne bloque pas la lecture) ;
+    force : envoi immédiat même si le KindleWatcher tourne (test)"""
     if not KINDLE_AVAILABLE or not KINDLE_CONFIG['enabled']:
         return
+    # Après un badge, le KindleWatcher affiche déjà album + morceau dès que Roon
+    # signale la lecture ; un rendu sans morceau effacerait la ligne du morceau
+    if not force and kindle_watcher and kindle_watcher.is_alive():
+        return
 
     def do_update():
         try:
             # Attendre que la lecture démarre
-            time.sleep(2)
+            if not force:
+                time.sleep(2)
 
-            # Récupérer l'URL de la pochette
-            cover_url = None
-            if card.get('image_key'):
-                cover_url = roon.get_image_url(card['image_key'])
+            # Pochette depuis le cache (déjà en 480 px)
+            cover_path = artwork.path(card.get('image_key'), "kindle")
 
             # Mettre à jour le Kindle
             update_kindle_display(
-                cover_url=cover_url,
+                cover_path=cover_path,
+                image_key=card.get('image_key'),
                 album=card.get('title', ''),
                 artist=card.get('artist', ''),
                 year=card.get('year', ''),
-                track="",  # Sera mis à jour par le thread de surveillance si activé
-                kindle_ip=KINDLE_CONFIG['ip']
+                track="",
+                kindle_ip=KINDLE_CONFIG['ip'],
+                force=force
             )
             logger.info(f"Kindle mis à jour: {card.get('title')}")
         except Exception as e:
@@ -207,19 +324,10 @@ def update_kindle_async(card, roon):
     threading.Thread(target=do_update, daemon=True).start()
 
 
-def init_roon():
-    """Initialize Roon connection with retry"""
-    for attempt in range(3):
-        logger.info(f"Connecting to Roon (attempt {attempt + 1}/3)...")
-        if state.roon.connect():
-            logger.info("Roon connected")
-            return True
-        time.sleep(2)
-    logger.warning("Could not connect to Roon at startup")
-    return False
-
-
-init_roon()
+# Connexion Roon en arrière-plan : le serveur répond tout de suite,
+# /api/status indique "connecting" jusqu'à ce que Roon soit prêt
+logger.info("Connecting to Roon in the background...")
+state.roon.start()
 
 # Démarrer le thread de surveillance Kindle
 if KINDLE_AVAILABLE and KINDLE_CONFIG['enabled']:
@@ -227,6 +335,11 @@ if KINDLE_AVAILABLE and KINDLE_CONFIG['enabled']:
     kindle_watcher.start()
     logger.info("KindleWatcher démarré")
 
+RoonEventBroadcaster(state.roon).start()
+
+ref_resolver = CardRefResolver(state.roon)
+ref_resolver.start()
+
 
 def get_uid():
     """Extract UID from request"""
@@ -238,65 +351,113 @@ def get_uid():
     return uid.upper() if uid else None
 
 
+def get_reader():
+    """(reader ID, reader default zone) sent by nfc_reader"""
+    args = request.values
+    body = request.get_json(silent=True) or {}
+    return (args.get("reader") or body.get("reader"),
+            args.get("zone") or body.get("zone"))
+
+
 # === Main Routes ===
 
+def get_trace():
+    """Per-tap trace ID (and reader-side read time) sent by nfc_reader"""
+    args = request.values
+    return args.get("trace"), args.get("read_ms", type=float)
+
+
 @app.route("/badge", methods=["POST", "GET"])
 def badge():
     """Handle NFC badge scan"""
+    return handle_badge(get_uid(), *get_reader(), *get_trace())
+
+
+def badge_message(message: dict) -> dict:
+    """Tap received on the local socket (same fields as /badge)"""
+    uid = (message.get("uid") or "").upper() or None
+    result = handle_badge(uid, message.get("reader"), message.get("zone"),
+                          message.get("trace"), message.get("read_ms"))
+    return result[0] if isinstance(result, tuple) else result
+
+
+def handle_badge(uid, reader_id=None, reader_zone=None, trace_id=None, read_ms=None):
+    """Tap entry point for every transport: dict or (dict, HTTP status)"""
+    with tracer.trace(trace_id) as trace_id:
+        if read_ms is not None:
+            tracer.record(trace_id, "read_uid", read_ms)
+        with tracer.span("badge"):
+            return _badge(uid, reader_id, reader_zone)
+
+
+def _badge(uid, reader_id, reader_zone):
+    """Badge handling, timed inside the tap trace"""
     try:
-        uid = get_uid()
         if not uid:
-            return jsonify({"status": "error", "message": "no uid"}), 400
+            return {"status": "error", "message": "no uid"}, 400
 
         logger.info(f"Badge scanned: {uid}")
 
-        if uid not in state.mapping:
+        with tracer.span("badge.lookup"):
+            card = state.mapping.get(uid)
+
+        if card is None:
             state.scan(uid)
+            bus.publish("scan", {"uid": uid})
             logger.info("Card not programmed")
-            return jsonify({"status": "unknown", "uid": uid})
+            return {"status": "unknown", "uid": uid}
 
-        card = state.mapping[uid]
         action = card.get("action", "play")
         zone_id = card.get("zone_id")
+        if reader_id:
+            logger.info(f"Reader: {reader_id} (zone: {reader_zone or 'default'})")
+
+        # Zone réellement utilisée (zone de la carte, puis du lecteur, puis par défaut)
+        zone_name = state.roon.zone_name_for(zone_id, reader_zone)
+        where = zone_name or reader_id
 
-        # Ignore repeated scan for music cards (allow control/display actions)
-        if action == "play" and uid == state.last_uid and (time.time() - state.last_time) < 3600:
+        # Ignore repeated scan for music cards in the same zone (allow control/display actions)
+        if action == "play" and state.repeated(uid, where):
             logger.info("Same card scanned again, ignoring")
-            return jsonify({"status": "ignored", "message": "same card"})
+            return {"status": "ignored", "message": "same card"}
 
-        state.scan(uid)
+        # Roon indisponible : réponse immédiate plutôt qu'un lecteur bloqué
+        # (avant state.scan, pour que le même badge rejoue une fois Roon revenu)
+        if action != "display" and not state.roon.available:
+            link = state.roon.link
+            logger.warning(f"Roon {link.state}, badge refusé")
+            return {"status": "error", "message": f"Roon {link.state}", "roon": link.state}, 503
+
+        state.scan(uid, where)
+        bus.publish("scan", {"uid": uid})
 
         # Display action
         if action == "display":
             logger.info("Action: Display artwork")
-            # Crée un fichier flag sur Recalbox via SSH
-            try:
-                subprocess.run([
-                    "ssh", "-o", "StrictHostKeyChecking=no",
-                    "root@192.168.1.44",
-                    "touch /tmp/display-now"
-                ], timeout=5, check=False, capture_output=True)
-                logger.info("Display flag created on Recalbox")
-            except Exception as e:
-                logger.warning(f"Could not trigger display: {e}")
-            return jsonify({"status": "displaying"})
+            # Crée un fichier flag sur Recalbox via SSH (sans bloquer la requête)
+            get_host(RECALBOX_IP).submit("touch /tmp/display-now")
+            stats.record_play(uid, card, "display", zone=zone_name)
+            return {"status": "displaying"}
 
         # Control actions
         if action == "pause":
             logger.info("Action: Pause/Play")
-            ok = state.roon.control_playback("pause", zone_id=zone_id)
-            return jsonify({"status": "control" if ok else "error", "action": "pause"})
+            stats.record_play(uid, card, "pause", zone=zone_name)
+            ok = state.roon.control_playback("pause", zone_id=zone_id, reader_zone=reader_zone)
+            return {"status": "control" if ok else "error", "action": "pause"}
 
         if action == "volume":
             vol = card.get("volume", 50)
             logger.info(f"Action: Volume {vol}")
-            ok = state.roon.control_playback("volume", vol, zone_id=zone_id)
-            return jsonify({"status": "control" if ok else "error", "action": "volume", "level": vol})
+            stats.record_play(uid, card, "volume", zone=zone_name)
+            ok = state.roon.control_playback("volume", vol, zone_id=zone_id, reader_zone=reader_zone)
+            return {"status": "control" if ok else "error", "action": "volume", "level": vol}
 
         if action == "shuffle":
             logger.info("Action: Shuffle")
-            ok = state.roon.control_playback("shuffle", zone_id=zone_id)
-            return jsonify({"status": "control" if ok else "error", "action": "shuffle"})
+            stats.record_play(uid, card, "shuffle", zone=zone_name)
+            ok = state.roon.control_playback("shuffle", zone_id=zone_id, reader_zone=reader_zone)
+            return {"status": "control" if ok else "error", "action": "shuffle"}
 
         # Content playback
         ctype = card.get("content_type", "album")
@@ -305,22 +466,27 @@ def badge():
             "genre": {"genre": card.get("genre"), "subgenre": card.get("subgenre")},
             "playlist": {"playlist": card.get("playlist")},
         }.get(ctype, {})
+        if card.get("roon_ref"):
+            data["ref"] = card["roon_ref"]
 
         logger.info(f"{ctype}: {data}")
-        ok = state.roon.play_content(ctype, data, zone_id=zone_id)
+        ok = state.roon.play_content(ctype, data, zone_id=zone_id, reader_zone=reader_zone)
+        if card.get("roon_ref", {}).get("stale"):
+            ref_resolver.request(uid)
         if ok:
             state.playing = card
             state.current_playing = card
-            record_play(uid, card)
+            stats.record_play(uid, card, zone=zone_name)
+            publish_now_playing()
 
             # === AJOUT 3: Mise à jour Kindle après lecture ===
-            update_kindle_async(card, state.roon)
+            update_kindle_async(card)
 
-        return jsonify({"status": "playing" if ok else "error"})
+        return {"status": "playing" if ok else "error"}
 
     except Exception as e:
         logger.error(f"Badge error: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return {"status": "error", "message": str(e)}, 500
 
 
 @app.route("/")
@@ -341,19 +507,28 @@ def api_zones():
     return jsonify(state.roon.get_zones())
 
 
+def paginate(items: list):
+    """?offset=&limit= slice of a listing, full size in X-Total-Count"""
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = request.args.get("limit", type=int)
+    response = jsonify(items[offset:offset + limit] if limit else items[offset:])
+    response.headers["X-Total-Count"] = str(len(items))
+    return response
+
+
 @app.route("/api/genres")
 def api_genres():
-    return jsonify(state.roon.get_genres())
+    return paginate(state.roon.get_genres())
 
 
 @app.route("/api/subgenres/<genre>")
 def api_subgenres(genre):
-    return jsonify(state.roon.get_subgenres(genre))
+    return paginate(state.roon.get_subgenres(genre))
 
 
 @app.route("/api/playlists")
 def api_playlists():
-    return jsonify(state.roon.get_playlists())
+    return paginate(state.roon.get_playlists())
 
 
 @app.route("/api/search")
@@ -363,8 +538,18 @@ def api_search():
 
 @app.route("/api/image/<key>")
 def api_image(key):
-    url = state.roon.get_image_url(key)
-    return redirect(url) if url else ("", 404)
+    """Cover from the local cache (?size=full|thumb|kindle|crt)"""
+    size = request.args.get("size", "full")
+    if size not in SIZES:
+        return jsonify({"status": "error", "message": "Invalid size"}), 400
+    path = artwork.path(key, size)
+    if not path:
+        return "", 404
+
+    response = send_file(path, mimetype=mimetype(path), etag=ArtworkCache.etag(key, size),
+                         conditional=True)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
 
 
 @app.route("/api/last-scan")
@@ -374,20 +559,100 @@ def api_last_scan():
 
 @app.route("/api/now-playing")
 def api_now_playing():
-    # Info from Roon (current track)
-    roon_info = state.roon.get_now_playing()
-    # Info from our state (scanned card)
-    card_info = state.playing
+    # Info from Roon (current track) + our state (scanned card)
+    return jsonify(now_playing_payload())
+
+
+@app.route("/api/events")
+def api_events():
+    """Server-Sent Events: scan, now_playing, card_saved, zone_changed, roon_status"""
+    initial = [("now_playing", now_playing_payload())]
+    if state.valid_scan():
+        initial.append(("scan", {"uid": state.last_uid}))
+    return Response(
+        stream_with_context(bus.stream(initial)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
+@app.route("/api/status")
+def api_status():
+    """État de la connexion Roon (connected, degraded, reconnecting, down)"""
     return jsonify({
-        "card": card_info,
-        "track": roon_info
+        "roon": state.roon.link.status(),
+        "queued_commands": state.roon.commands.pending(),
     })
 
 
+@app.route("/api/debug/traces")
+def api_debug_traces():
+    """Per-stage latency percentiles and the most recent tap traces"""
+    return jsonify({
+        "stages": tracer.stats(),
+        "traces": tracer.traces(request.args.get("limit", 20, type=int))
+    })
+
+
+@app.route("/api/debug/traces", methods=["POST"])
+def api_debug_traces_post():
+    """Reader-side spans (send_to_server) reported after the tap"""
+    data = request.json or {}
+    if not data.get("trace"):
+        return jsonify({"status": "error", "message": "no trace"}), 400
+    for span in data.get("spans", []):
+        tracer.record(data.get("trace"), span.get("stage"), float(span.get("ms", 0)))
+    return jsonify({"status": "success"})
+
+
 @app.route("/api/stats")
 def api_stats():
-    return jsonify(get_stats_summary())
+    return jsonify(stats.summary())
+
+
+def parse_time_arg(value: str) -> float | None:
+    """Unix timestamp, year ("2026") or ISO date ("2026-03", "2026-03-01T20:00")"""
+    if not value:
+        return None
+    if len(value) == 4 and value.isdigit():
+        return datetime(int(value), 1, 1).timestamp()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value if len(value) > 7 else value + "-01").timestamp()
+
+
+@app.route("/api/stats/history")
+def api_stats_history():
+    """Plays per bucket
+
+    ?group_by=hour|weekday|day|month|card|zone|action or a card field (genre, artist...)
+    ?from=2026-01-01  ?to=2026-02-01  ?top=10
+    ?action=play,pause (default: plays; imported plays only outside time buckets)
+    """
+    group_by = request.args.get("group_by", "day")
+    actions = [a for a in request.args.get("action", "").split(",") if a] or None
+    if actions and any(a not in ACTIONS for a in actions):
+        return jsonify({"status": "error", "message": "Invalid action"}), 400
+    try:
+        start = parse_time_arg(request.args.get("from"))
+        end = parse_time_arg(request.args.get("to"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid date"}), 400
+
+    t0 = time.perf_counter()
+    buckets = stats.query(group_by, start, end, actions, request.args.get("top", type=int))
+    return jsonify({
+        "group_by": group_by,
+        "buckets": buckets,
+        "query_ms": round((time.perf_counter() - t0) * 1000, 2),
+    })
+
+
+@app.route("/api/stats/idle")
+def api_stats_idle():
+    """Cards not played in ?days=90"""
+    return jsonify(stats.idle_cards(request.args.get("days", 90, type=int)))
 
 
 @app.route("/api/settings")
@@ -433,7 +698,7 @@ def api_kindle_test():
         return jsonify({"status": "error", "message": "kindle_display non disponible"}), 400
 
     if state.current_playing:
-        update_kindle_async(state.current_playing, state.roon)
+        update_kindle_async(state.current_playing, force=True)
         return jsonify({"status": "success", "message": "Mise à jour envoyée"})
     else:
         # Test avec données fictives
@@ -444,7 +709,8 @@ def api_kindle_test():
                 artist="Test Artist",
                 year="2024",
                 track="Test Track",
-                kindle_ip=KINDLE_CONFIG['ip']
+                kindle_ip=KINDLE_CONFIG['ip'],
+                force=True
             )
             return jsonify({"status": "success", "message": "Test envoyé"})
         except Exception as e:
@@ -456,11 +722,13 @@ def api_kindle_test():
 @app.route("/api/cards")
 def api_cards():
     """List all programmed cards"""
+    items = state.mapping.items()
+    zone_names = state.roon.get_zone_names({data["zone_id"] for _, data in items if data.get("zone_id")})
     cards = []
-    for uid, data in state.mapping.items():
+    for uid, data in items:
         card = {"uid": uid, **data}
         if data.get("zone_id"):
-            card["zone_name"] = state.roon.get_zone_name(data["zone_id"])
+            card["zone_name"] = zone_names[data["zone_id"]]
         cards.append(card)
     return jsonify(cards)
 
@@ -538,7 +806,10 @@ def api_cards_post():
         card["zone_id"] = data["zone_id"]
 
     state.mapping[uid] = card
-    save_mapping(state.mapping)
+    # Référence Roon résolue en arrière-plan (un badge d'ici là suit le chemin de navigation)
+    if action == "play":
+        ref_resolver.request(uid)
+    bus.publish("card_saved", {"uid": uid, "card": card})
     logger.info(f"Card saved: {uid} -> {card.get('title')}")
     return jsonify({"status": "success"})
 
@@ -550,7 +821,7 @@ def api_cards_delete(uid):
     if uid not in state.mapping:
         return jsonify({"status": "error", "message": "Not found"}), 404
     del state.mapping[uid]
-    save_mapping(state.mapping)
+    bus.publish("card_saved", {"uid": uid, "card": None})
     return jsonify({"status": "success"})
 
 
@@ -566,14 +837,7 @@ def api_test_play():
     zone_id = card.get("zone_id")
 
     if action == "display":
-        try:
-            subprocess.run([
-                "ssh", "-o", "StrictHostKeyChecking=no",
-                "root@192.168.1.44",
-                "touch /tmp/display-now"
-            ], timeout=5, check=False, capture_output=True)
-        except:
-            pass
+        get_host(RECALBOX_IP).submit("touch /tmp/display-now")
         return jsonify({"status": "success"})
     elif action == "pause":
         ok = state.roon.control_playback("pause", zone_id=zone_id)
@@ -586,11 +850,13 @@ def api_test_play():
             "genre": {"genre": card.get("genre"), "subgenre": card.get("subgenre")},
             "playlist": {"playlist": card.get("playlist")},
         }.get(ctype, {})
+        if card.get("roon_ref"):
+            data["ref"] = card["roon_ref"]
         ok = state.roon.play_content(ctype, data, zone_id=zone_id)
 
         # Mise à jour Kindle aussi pour test-play
         if ok:
-            update_kindle_async(card, state.roon)
+            update_kindle_async(card)
 
     return jsonify({"status": "success" if ok else "error"})
 
@@ -599,84 +865,30 @@ def api_test_play():
 
 @app.route("/api/export-pdf")
 def api_export_pdf():
-    """Generate PDF with album covers (4.5cm each)"""
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import cm
-    from reportlab.lib.utils import ImageReader
-    from io import BytesIO
-    from flask import send_file
-    import urllib.request
-
-    # Settings
-    COVER_SIZE = 4.5 * cm
-    MARGIN = 1 * cm
-    SPACING = 0.3 * cm
-
-    # Get cards with images
-    cards = []
-    for uid, data in state.mapping.items():
-        if data.get("image_key") and data.get("action") == "play":
-            cards.append(data)
+    """Generate PDF with album covers (4.5cm each)
 
-    if not cards:
-        return jsonify({"status": "error", "message": "No cards with covers"}), 400
-
-    # Create PDF
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+    Optional filters: ?uids=A,B  ?q=text (title/artist)  ?pages=2-3
+    """
+    uids = {u.strip().upper() for u in request.args.get("uids", "").split(",") if u.strip()}
+    cards = [data for uid, data in state.mapping.items()
+             if data.get("image_key") and data.get("action") == "play" and (not uids or uid in uids)]
 
-    # Calculate grid
-    cols = int((width - 2 * MARGIN + SPACING) / (COVER_SIZE + SPACING))
-    rows = int((height - 2 * MARGIN + SPACING) / (COVER_SIZE + SPACING))
+    query = request.args.get("q", "").lower()
+    if query:
+        cards = [c for c in cards if query in f"{c.get('title', '')} {c.get('artist', '')}".lower()]
 
-    x_start = MARGIN
-    y_start = height - MARGIN - COVER_SIZE
-
-    col = 0
-    row = 0
+    if not cards:
+        return jsonify({"status": "error", "message": "No cards with covers"}), 400
 
-    for card in cards:
-        # Position
-        x = x_start + col * (COVER_SIZE + SPACING)
-        y = y_start - row * (COVER_SIZE + SPACING)
+    try:
+        pages = parse_pages(request.args.get("pages", ""))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid pages"}), 400
 
-        # Get image
-        try:
-            img_url = state.roon.get_image_url(card.get("image_key"))
-            if img_url:
-                img_data = urllib.request.urlopen(img_url, timeout=10).read()
-                img_buffer = BytesIO(img_data)
-                img = ImageReader(img_buffer)
-                c.drawImage(img, x, y, width=COVER_SIZE, height=COVER_SIZE)
-                # Draw thin black border for cutting guide
-                c.setStrokeColorRGB(0, 0, 0)
-                c.setLineWidth(0.5)
-                c.rect(x, y, COVER_SIZE, COVER_SIZE, stroke=1, fill=0)
-        except Exception as e:
-            # Draw placeholder with title
-            c.setStrokeColorRGB(0.5, 0.5, 0.5)
-            c.rect(x, y, COVER_SIZE, COVER_SIZE)
-            c.setFont("Helvetica", 8)
-            c.setFillColorRGB(0.3, 0.3, 0.3)
-            title = card.get("title", "?")[:25]
-            c.drawString(x + 5, y + COVER_SIZE / 2, title)
-
-        # Next position
-        col += 1
-        if col >= cols:
-            col = 0
-            row += 1
-            if row >= rows:
-                c.showPage()
-                row = 0
-
-    c.save()
-    buffer.seek(0)
+    pdf = build_pdf(cards, lambda key: artwork.path(key, "print"), pages)
 
     return send_file(
-        buffer,
+        BytesIO(pdf),
         mimetype='application/pdf',
         download_name='nfc-covers.pdf',
         as_attachment=True
@@ -693,7 +905,7 @@ def get_current():
 
     image_url = ""
     if state.current_playing.get('image_key'):
-        image_url = state.roon.get_image_url(state.current_playing['image_key'])
+        image_url = url_for("api_image", key=state.current_playing['image_key'], size="crt", _external=True)
 
     return jsonify({
         "playing": True,
@@ -713,7 +925,7 @@ def get_current_playing():
 
     image_url = ""
     if now_playing.get('image_key'):
-        image_url = state.roon.get_image_url(now_playing['image_key'])
+        image_url = url_for("api_image", key=now_playing['image_key'], size="crt", _external=True)
 
     return jsonify({
         "playing": True,
@@ -747,6 +959,14 @@ if __name__ == "__main__":
     logger.info(f"Kindle: {'enabled' if KINDLE_AVAILABLE and KINDLE_CONFIG['enabled'] else 'disabled'}")
     logger.info("=" * 50)
 
+    # Lecteurs NFC locaux : socket Unix persistante (pas de connexion TCP par badge)
+    if badge_socket.AVAILABLE:
+        badge_socket.serve(badge_message)
+        logger.info(f"Badge socket: {badge_socket.BADGE_SOCKET}")
+
+    # systemd stop (SIGTERM) -> sortie propre, les stats en attente sont écrites (atexit)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
     # Reduce werkzeug logging verbosity
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
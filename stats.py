@@ -0,0 +1,174 @@
+"""NFC Roon Controller - Play statistics (batched writes to the listening history)"""
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from history import PlayHistory, PLAY_ACTIONS, TIMED_PLAY_ACTIONS, TIME_BUCKETS
+from utils import load_stats
+
+FLUSH_INTERVAL = 30  # seconds between appends to the history log
+FLUSH_BATCH = 20     # flush earlier once this many events are pending
+TOP_CARDS = 10
+
+
+class StatsRecorder:
+    """
+    record_play() only queues the event; a background writer appends queued
+    events to the history log in batches, and a final flush runs at exit.
+
+    Summary counters and the top cards are kept up to date on each play
+    (built once from the history at startup); analytics queries scan the
+    history log.
+    """
+
+    def __init__(self, history: PlayHistory = None, cards=None):
+        self.history = history or PlayHistory()
+        self.cards = cards              # uid -> card (titles, genre...)
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._import_stats()
+        self._agg_lock = threading.Lock()
+        self._load_aggregates()
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _import_stats(self):
+        """One-time import of stats.json totals (timestamps spread first -> last play)"""
+        if self.history.meta.get("stats_imported"):
+            return
+        events = []
+        for uid, data in load_stats().get("cards", {}).items():
+            plays = data.get("plays", 0)
+            if not plays:
+                continue
+            first = _parse_time(data.get("first_play") or data.get("last_play"))
+            last = _parse_time(data.get("last_play")) or first
+            for ts in np.linspace(first or time.time(), last or time.time(), plays):
+                events.append((ts, uid, "", "imported", data.get("title", "")))
+        events.sort(key=lambda e: e[0])
+        self.history.append(events)
+        self.history.meta["stats_imported"] = len(events)
+        self.history.save_meta()
+        if events:
+            print(f"Imported {len(events)} plays from stats.json")
+
+    def _load_aggregates(self):
+        plays = self.history.select(actions=PLAY_ACTIONS)
+        self._cards = {uid: list(a) for uid, a in self.history.card_activity(plays).items()}
+        self._total = int(len(plays))
+        self._first_use = int(plays["ts"].min()) if len(plays) else None
+        self._top = sorted(self._cards, key=lambda uid: self._cards[uid][0], reverse=True)[:TOP_CARDS]
+
+    def _count_play(self, uid: str, ts: float):
+        """Update counters and the top cards for one play, O(k)"""
+        with self._agg_lock:
+            ts = int(ts)
+            activity = self._cards.setdefault(uid, [0, ts, ts])
+            activity[0] += 1
+            activity[2] = ts
+            self._total += 1
+            if self._first_use is None:
+                self._first_use = ts
+
+            # Counts only grow, so only this card can move into / up the ranking
+            if uid not in self._top:
+                if len(self._top) < TOP_CARDS:
+                    self._top.append(uid)
+                elif activity[0] > self._cards[self._top[-1]][0]:
+                    self._top[-1] = uid
+                else:
+                    return
+            i = self._top.index(uid)
+            while i > 0 and self._cards[self._top[i - 1]][0] < activity[0]:
+                self._top[i - 1], self._top[i] = self._top[i], self._top[i - 1]
+                i -= 1
+
+    def record_play(self, uid: str, card_info: dict, action: str = "play", zone: str = None):
+        """Queue a card event in the zone it played in (no disk I/O on the caller's thread)"""
+        now = time.time()
+        self._pending.append((now, uid, zone or "", action, card_info.get("title", "")))
+        if action in PLAY_ACTIONS:
+            self._count_play(uid, now)
+        if len(self._pending) >= FLUSH_BATCH:
+            self._wake.set()
+
+    def flush(self):
+        """Append queued events to the history log"""
+        with self._lock:
+            events = []
+            while self._pending:
+                events.append(self._pending.popleft())
+            self.history.append(events)
+
+    def _writer_loop(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Stats flush error: {e}")
+
+    def _title(self, uid: str) -> str:
+        card = self.cards.get(uid) if self.cards is not None else None
+        return (card or {}).get("title") or self.history.title(uid)
+
+    def _card(self, uid: str):
+        return self.cards.get(uid) if self.cards is not None else None
+
+    def summary(self) -> dict:
+        """Get statistics summary for display (in-memory counters, no disk read)"""
+        with self._agg_lock:
+            top = [(uid, *self._cards[uid]) for uid in self._top]
+            total, unique, first_use = self._total, len(self._cards), self._first_use
+
+        return {
+            "total_plays": total,
+            "unique_cards": unique,
+            "first_use": _iso(first_use) if first_use is not None else None,
+            "top_cards": [{
+                "uid": uid,
+                "plays": plays,
+                "title": self._title(uid),
+                "first_play": _iso(first),
+                "last_play": _iso(last),
+            } for uid, plays, first, last in top]
+        }
+
+    def query(self, group_by: str, start=None, end=None, actions=None, top=None) -> list:
+        """Plays per bucket over a time range (time unit, card, zone, action or card field)"""
+        if actions is None:
+            actions = TIMED_PLAY_ACTIONS if group_by in TIME_BUCKETS else PLAY_ACTIONS
+        self.flush()
+        rec = self.history.select(start, end, actions)
+        return self.history.group(rec, group_by, top=top, attribute=self._card)
+
+    def idle_cards(self, days: int) -> list:
+        """Programmed cards not played in the last `days` days (never played first)"""
+        with self._agg_lock:
+            activity = {uid: tuple(a) for uid, a in self._cards.items()}
+        cutoff = time.time() - days * 86400
+        idle = []
+        for uid, card in (self.cards.items() if self.cards is not None else []):
+            last = activity.get(uid, (0, 0, 0))[2]
+            if last < cutoff:
+                idle.append({"uid": uid, "title": card.get("title", ""),
+                             "last_play": _iso(last) if last else None})
+        return sorted(idle, key=lambda c: c["last_play"] or "")
+
+
+def _parse_time(value: str) -> float | None:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts).isoformat()
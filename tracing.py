@@ -0,0 +1,122 @@
+"""NFC Roon Controller - Tap-to-play latency tracing"""
+import contextvars
+import functools
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+TRACE_BUFFER_SIZE = 2000  # spans kept in memory
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+
+
+@dataclass(frozen=True)
+class Span:
+    """One timed stage of a tap"""
+    trace_id: str
+    stage: str
+    start: float
+    duration_ms: float
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class Tracer:
+    """Bounded ring buffer of spans, only recorded inside an active trace"""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE):
+        self._spans = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, trace_id: str = None):
+        """Make spans recorded in this thread belong to `trace_id`"""
+        token = _current_trace.set(trace_id or new_trace_id())
+        try:
+            yield _current_trace.get()
+        finally:
+            _current_trace.reset(token)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a block; no-op outside a trace (crawlers, watchers...)"""
+        trace_id = _current_trace.get()
+        if trace_id is None:
+            yield
+            return
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(trace_id, stage, (time.perf_counter() - t0) * 1000, start)
+
+    def wrap(self, func, stage: str):
+        """Decorate a callable so each call is a span"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def instrument(self, obj, names, prefix: str):
+        """Replace methods of an instance with traced versions"""
+        for name in names:
+            setattr(obj, name, self.wrap(getattr(obj, name), f"{prefix}.{name}"))
+
+    def record_current(self, stage: str, duration_ms: float):
+        """Record an already measured span in the active trace (if any)"""
+        trace_id = _current_trace.get()
+        if trace_id is not None:
+            self.record(trace_id, stage, duration_ms, time.time() - duration_ms / 1000)
+
+    def record(self, trace_id: str, stage: str, duration_ms: float, start: float = None):
+        with self._lock:
+            self._spans.append(Span(trace_id, stage, start or time.time(), round(duration_ms, 3)))
+
+    def stats(self) -> dict:
+        """count/p50/p95/p99 (ms) per stage"""
+        with self._lock:
+            spans = list(self._spans)
+        by_stage = {}
+        for s in spans:
+            by_stage.setdefault(s.stage, []).append(s.duration_ms)
+        result = {}
+        for stage, values in sorted(by_stage.items()):
+            values.sort()
+            result[stage] = {"count": len(values), "p50": percentile(values, 50),
+                             "p95": percentile(values, 95), "p99": percentile(values, 99)}
+        return result
+
+    def traces(self, limit: int = 20) -> list:
+        """Most recent traces with their spans in start order"""
+        with self._lock:
+            spans = list(self._spans)
+        grouped = {}
+        for s in spans:
+            grouped.setdefault(s.trace_id, []).append(s)
+        recent = sorted(grouped.items(), key=lambda kv: kv[1][0].start, reverse=True)[:limit]
+        return [{"trace_id": tid, "spans": [asdict(s) for s in sorted(items, key=lambda s: s.start)]}
+                for tid, items in recent]
+
+
+tracer = Tracer()
+
+
+def traced(stage: str):
+    """Method decorator recording a span under `stage`"""
+    return lambda func: tracer.wrap(func, stage)
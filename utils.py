@@ -2,7 +2,6 @@
 import json
 import os
 import re
-from datetime import datetime
 
 # File paths
 MAPPING_FILE = "mapping.json"
@@ -12,40 +11,56 @@ STATS_FILE = "stats.json"
 
 # === Mapping (card associations) ===
 
-def load_mapping() -> dict:
-    """Load card-to-content mapping from file"""
-    if os.path.exists(MAPPING_FILE):
+def load_mapping(path: str = MAPPING_FILE) -> dict:
+    """Load card-to-content mapping from file (legacy format, see card_store)"""
+    if os.path.exists(path):
         try:
-            with open(MAPPING_FILE, "r", encoding="utf-8") as f:
+            with open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
         except:
             pass
     return {}
 
 
-def save_mapping(mapping: dict):
-    """Save card-to-content mapping to file"""
-    with open(MAPPING_FILE, "w", encoding="utf-8") as f:
-        json.dump(mapping, f, indent=2, ensure_ascii=False)
-
-
 # === Roon Token ===
 
-def load_token() -> str | None:
-    """Load Roon authentication token"""
+def _load_token_file() -> dict:
     if os.path.exists(TOKEN_FILE):
         try:
             with open(TOKEN_FILE, "r") as f:
-                return json.load(f).get("token")
+                return json.load(f)
         except:
             pass
-    return None
+    return {}
+
+
+def _update_token_file(**fields):
+    data = {**_load_token_file(), **fields}
+    with open(TOKEN_FILE, "w") as f:
+        json.dump(data, f)
+
+
+def load_token() -> str | None:
+    """Load Roon authentication token"""
+    return _load_token_file().get("token")
 
 
 def save_token(token: str):
     """Save Roon authentication token"""
-    with open(TOKEN_FILE, "w") as f:
-        json.dump({"token": token}, f)
+    _update_token_file(token=token)
+
+
+def load_core() -> tuple | None:
+    """Last Roon core that accepted a connection: (host, port)"""
+    data = _load_token_file()
+    if data.get("host") and data.get("port"):
+        return data["host"], data["port"]
+    return None
+
+
+def save_core(host: str, port: int):
+    """Remember the Roon core for the next start (skips discovery)"""
+    _update_token_file(host=host, port=port)
 
 
 # === Statistics ===
@@ -61,57 +76,6 @@ def load_stats() -> dict:
     return {"cards": {}, "total_plays": 0, "first_use": None}
 
 
-def save_stats(stats: dict):
-    """Save usage statistics"""
-    with open(STATS_FILE, "w", encoding="utf-8") as f:
-        json.dump(stats, f, indent=2, ensure_ascii=False)
-
-
-def record_play(uid: str, card_info: dict):
-    """Record a card play in statistics"""
-    stats = load_stats()
-    
-    now = datetime.now().isoformat()
-    
-    if not stats.get("first_use"):
-        stats["first_use"] = now
-    
-    stats["total_plays"] = stats.get("total_plays", 0) + 1
-    
-    if uid not in stats.get("cards", {}):
-        stats["cards"][uid] = {
-            "plays": 0,
-            "title": card_info.get("title", ""),
-            "first_play": now
-        }
-    
-    stats["cards"][uid]["plays"] += 1
-    stats["cards"][uid]["last_play"] = now
-    stats["cards"][uid]["title"] = card_info.get("title", stats["cards"][uid].get("title", ""))
-    
-    save_stats(stats)
-
-
-def get_stats_summary() -> dict:
-    """Get statistics summary for display"""
-    stats = load_stats()
-    
-    # Sort cards by play count
-    cards = stats.get("cards", {})
-    top_cards = sorted(
-        [{"uid": uid, **data} for uid, data in cards.items()],
-        key=lambda x: x.get("plays", 0),
-        reverse=True
-    )[:10]
-    
-    return {
-        "total_plays": stats.get("total_plays", 0),
-        "unique_cards": len(cards),
-        "first_use": stats.get("first_use"),
-        "top_cards": top_cards
-    }
-
-
 # === Helpers ===
 
 def clean_artist(artist: str) -> str: